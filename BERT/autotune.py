@@ -0,0 +1,179 @@
+"""Chọn số intra-op/inter-op thread và batch size tốt nhất cho máy đang chạy, đo trên data/r*.txt.
+
+Mỗi cặp (intra-op, inter-op) được đo trong một process con riêng vì số inter-op thread chỉ đặt
+được một lần trong mỗi process. Throughput và p95 latency của mọi cấu hình được ghi vào profile
+(mặc định <NER_MODEL_DIR>/runtime_profile.json, cùng chỗ server.py tìm) cùng cấu hình tốt nhất,
+server.py đọc profile khi khởi động.
+
+Usage:
+    python autotune.py [--data "data/r*.txt"] [--intra 1,2,4] [--interop 1,2] [--batch-sizes 1,2,4,8,16]
+                       [--workers 1] [--max-p95-ms 0] [--output <NER_MODEL_DIR>/runtime_profile.json]
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+def parse_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def default_intra_threads(workers: int) -> str:
+    """1, 2, 4, ... tới số CPU chia cho mỗi worker."""
+    budget = max(1, (os.cpu_count() or 1) // workers)
+    values = []
+    threads = 1
+    while threads < budget:
+        values.append(threads)
+        threads *= 2
+    values.append(budget)
+    return ",".join(str(value) for value in values)
+
+
+def measure(args) -> list:
+    """Chạy trong process con: đo mọi batch size với số thread đã đặt qua biến môi trường."""
+    import server
+
+    server.configure_worker_threads(forked=False)
+
+    texts = []
+    for path in sorted(glob.glob(args.data)):
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    sequences = [
+        window_tokens
+        for _, windows in server.prepare_windows_batch(texts, args.mode)
+        for _, window_tokens in windows
+    ]
+
+    results = []
+    for batch_size in parse_list(args.batch_sizes):
+        batches = [sequences[i : i + batch_size] for i in range(0, len(sequences), batch_size)]
+        server.predict_token_batch(batches[0])  # warmup
+
+        latencies_ms = []
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for batch in batches:
+                batch_started = time.perf_counter()
+                server.predict_token_batch(batch)
+                latencies_ms.append((time.perf_counter() - batch_started) * 1000)
+        elapsed = time.perf_counter() - started
+
+        results.append(
+            {
+                "intra_op_threads": args.intra_threads,
+                "inter_op_threads": args.interop_threads,
+                "batch_size": batch_size,
+                "sequences_per_s": round(len(sequences) * args.rounds / elapsed, 2),
+                "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+                "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+            }
+        )
+    return results
+
+
+def run_measurement(args, intra: int, interop: int) -> list:
+    """Đo một cặp (intra-op, inter-op) trong process con, trả về kết quả theo từng batch size."""
+    env = dict(
+        os.environ,
+        NER_TORCH_THREADS=str(intra),
+        NER_TORCH_INTEROP_THREADS=str(interop),
+        NER_ONNX_THREADS=str(intra),
+        NER_WORKERS="1",
+        NER_RUNTIME_PROFILE="",
+        NER_DISK_CACHE="",
+        NER_SCHEDULER="0",
+    )
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--measure",
+        "--data", args.data,
+        "--mode", args.mode,
+        "--batch-sizes", args.batch_sizes,
+        "--rounds", str(args.rounds),
+        "--intra-threads", str(intra),
+        "--interop-threads", str(interop),
+    ]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr)
+        raise RuntimeError(f"Measurement failed for intra={intra}, interop={interop}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def select_best(results: list, max_p95_ms: float):
+    """Cấu hình có throughput cao nhất, trong số cấu hình thoả p95 <= max_p95_ms (nếu có)."""
+    candidates = [r for r in results if not max_p95_ms or r["p95_ms"] <= max_p95_ms]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda r: (r["sequences_per_s"], -r["p95_ms"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune thread counts and batch size for server.py")
+    parser.add_argument("--data", default=os.path.join("data", "r*.txt"))
+    parser.add_argument("--mode", default="truncate", choices=("truncate", "window", "segment", "incremental"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("NER_WORKERS", "1")),
+                        help="Số worker sẽ chạy, giới hạn số intra-op thread của mỗi worker")
+    parser.add_argument("--intra", default=None, help="Danh sách số intra-op thread, ví dụ 1,2,4")
+    parser.add_argument("--interop", default="1,2")
+    parser.add_argument("--batch-sizes", default="1,2,4,8,16")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="Giới hạn p95 latency, 0 = không giới hạn")
+    parser.add_argument("--output", default=os.path.join(os.getenv("NER_MODEL_DIR", "models"), "runtime_profile.json"))
+    # Dùng nội bộ cho process con
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--intra-threads", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--interop-threads", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args)))
+        sys.exit(0)
+
+    if not glob.glob(args.data):
+        print(f"No files found in {args.data}")
+        sys.exit(1)
+
+    results = []
+    for intra in parse_list(args.intra or default_intra_threads(args.workers)):
+        for interop in parse_list(args.interop):
+            for result in run_measurement(args, intra, interop):
+                print(json.dumps(result))
+                results.append(result)
+
+    best = select_best(results, args.max_p95_ms)
+    if best is None:
+        print(f"No configuration meets p95 <= {args.max_p95_ms} ms, profile not written")
+        sys.exit(1)
+
+    profile = {
+        "created_at": datetime.now().isoformat(),
+        "backend": os.getenv("NER_BACKEND", "torch"),
+        "cpu_count": os.cpu_count(),
+        "workers": args.workers,
+        "data": args.data,
+        "mode": args.mode,
+        "max_p95_ms": args.max_p95_ms,
+        "settings": {
+            "intra_op_threads": best["intra_op_threads"],
+            "inter_op_threads": best["inter_op_threads"],
+            "batch_size": best["batch_size"],
+        },
+        "best": best,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    print(f"Best configuration: {json.dumps(best)}")
+    print(f"Profile written to {args.output}")
@@ -0,0 +1,211 @@
+"""Benchmark có thể lặp lại cho pipeline NER: chạy lại data/r*.txt và các biến thể dài hơn
+(ghép nhiều CV, chọn ngẫu nhiên theo seed) trong process (predict_cv_batch, không qua cache),
+hoặc qua HTTP tới server đang chạy. Cả hai cách dựng kết quả cùng dạng --format như /resume_parsing
+(mặc định columnar), để số đo của hai cách so sánh được với nhau.
+
+Báo cáo CVs/sec, wordpieces/sec, latency p50/p95/p99 và peak RSS (của process này khi chạy
+trong process, của server khi truyền --server-pid), xuất ra JSON.
+
+Khi đo qua HTTP nên chạy server với NER_CACHE_MAX_MB=0 NER_DISK_CACHE="" để mọi request
+đều chạy model (hoặc dùng --bust-cache).
+
+Usage:
+    python benchmark.py [--data "data/r*.txt"] [--long-factors 2,4] [--mode truncate] [--format columnar] [--rounds 1]
+                        [--url http://localhost:6969] [--concurrency 4] [--server-pid PID]
+                        [--output benchmark.json]
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+RESULT_FORMATS = ("tokens", "columnar", "entities")
+
+
+def load_corpus(data_glob: str) -> list:
+    texts = []
+    for path in sorted(glob.glob(data_glob)):
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    return texts
+
+
+def synthetic_long(texts: list, factor: int, count: int, rng: random.Random) -> list:
+    """CV tổng hợp dài gấp ~factor lần: ghép factor CV chọn ngẫu nhiên."""
+    return ["\n".join(rng.choice(texts) for _ in range(factor)) for _ in range(count)]
+
+
+def peak_rss_mb(pid=None):
+    """Peak RSS (VmHWM) của process pid, hoặc của process hiện tại nếu pid là None."""
+    if pid is None:
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def summarize(latencies_ms: list, wordpieces, elapsed: float, errors: int = 0) -> dict:
+    """wordpieces là None khi không đếm được (format entities qua HTTP không trả token)."""
+    return {
+        "cvs": len(latencies_ms),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "cvs_per_s": round(len(latencies_ms) / elapsed, 3) if elapsed else None,
+        "wordpieces_per_s": round(wordpieces / elapsed, 1) if elapsed and wordpieces is not None else None,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2) if latencies_ms else None,
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2) if latencies_ms else None,
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 2) if latencies_ms else None,
+    }
+
+
+def build_result(server, cv_data: str, mode: str, result_format: str) -> tuple:
+    """Dự đoán một CV và dựng kết quả như /resume_parsing: (kết quả, số wordpiece)."""
+    temp_token, result_ids, confidence_scores = server.predict_cv_batch([cv_data], mode)[0]
+    if result_format == "entities":
+        result = server.build_entities(temp_token, result_ids, confidence_scores)
+    elif result_format == "columnar":
+        result = server.build_columnar(temp_token, result_ids, confidence_scores)
+    else:
+        result = server.build_token_tag_pairs(temp_token, result_ids, confidence_scores)
+    return result, len(temp_token)
+
+
+def run_in_process(texts: list, mode: str, rounds: int, result_format: str) -> dict:
+    # Mặc định không qua inference scheduler: các CV được gửi tuần tự nên mỗi lần gọi chỉ phải chờ
+    # thêm NER_SCHEDULER_MAX_WAIT_MS; đặt NER_SCHEDULER=1 để đo cả scheduler (ghi trong report)
+    os.environ.setdefault("NER_SCHEDULER", "0")
+    import server
+
+    # Chia thread như một worker của server (NER_WORKERS, NER_TORCH_THREADS)
+    server.configure_worker_threads(False)
+    build_result(server, texts[0], mode, result_format)  # warmup
+
+    latencies_ms = []
+    wordpieces = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for cv_data in texts:
+            request_started = time.perf_counter()
+            _, sequence_wordpieces = build_result(server, cv_data, mode, result_format)
+            latencies_ms.append((time.perf_counter() - request_started) * 1000)
+            wordpieces += sequence_wordpieces
+    return summarize(latencies_ms, wordpieces, time.perf_counter() - started)
+
+
+def post_json(url: str, payload: dict, timeout: float) -> dict:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def run_http(texts: list, args) -> dict:
+    url = args.url.rstrip("/") + "/resume_parsing"
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    def send(item):
+        index, cv_data = item
+        if args.bust_cache:
+            cv_data = f"{cv_data}\nbench-{run_id}-{index}"
+        request_started = time.perf_counter()
+        try:
+            result = post_json(url, {"cv": cv_data, "mode": args.mode, "format": args.format}, args.timeout)
+            return (time.perf_counter() - request_started) * 1000, len(result.get("tokens", ())), None
+        except Exception as e:
+            return (time.perf_counter() - request_started) * 1000, 0, str(e)
+
+    send((-1, texts[0]))  # warmup
+    items = list(enumerate(texts * args.rounds))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        responses = list(executor.map(send, items))
+    elapsed = time.perf_counter() - started
+
+    failed = [error for _, _, error in responses if error is not None]
+    if failed:
+        print(f"{len(failed)} HTTP requests failed, first error: {failed[0]}")
+    return summarize(
+        [latency for latency, _, error in responses if error is None],
+        None if args.format == "entities" else sum(wordpieces for _, wordpieces, _ in responses),
+        elapsed,
+        errors=len(failed),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproducible NER throughput/latency benchmark")
+    parser.add_argument("--data", default=os.path.join("data", "r*.txt"))
+    parser.add_argument("--long-factors", default="2,4", help="Độ dài các biến thể tổng hợp (số CV ghép lại)")
+    parser.add_argument("--long-count", type=int, default=50, help="Số CV tổng hợp cho mỗi biến thể")
+    parser.add_argument("--mode", default="truncate", choices=("truncate", "window", "segment", "incremental"))
+    parser.add_argument("--format", default="columnar", choices=RESULT_FORMATS, help="Dạng kết quả như /resume_parsing")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", default=None, help="Đo qua HTTP thay vì trong process")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--bust-cache", action="store_true", help="Thêm chuỗi duy nhất vào mỗi CV gửi qua HTTP")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID của server để đo peak RSS")
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus(args.data)
+    if not corpus:
+        print(f"No files found in {args.data}")
+        sys.exit(1)
+
+    workloads = [("corpus", corpus)]
+    for factor in [int(item) for item in args.long_factors.split(",") if item.strip()]:
+        workloads.append((f"long_x{factor}", synthetic_long(corpus, factor, args.long_count, rng)))
+
+    results = {}
+    for name, texts in workloads:
+        print(f"Running {name} ({len(texts)} CVs, {'http' if args.url else 'in-process'})")
+        results[name] = run_http(texts, args) if args.url else run_in_process(texts, args.mode, args.rounds, args.format)
+        print(f"  {json.dumps(results[name])}")
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "target": args.url or "in-process",
+        "mode": args.mode,
+        "format": args.format,
+        "rounds": args.rounds,
+        "seed": args.seed,
+        "data": args.data,
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "peak_rss_mb": peak_rss_mb(args.server_pid if args.url else None),
+        "workloads": results,
+    }
+    if not args.url:
+        import server
+
+        report["backend"] = server.NER_BACKEND
+        report["startup_timings"] = server.STARTUP_TIMINGS
+        report["torch_threads"] = server.torch.get_num_threads()
+        report["scheduler_enabled"] = server.SCHEDULER_ENABLED
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
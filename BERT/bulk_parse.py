@@ -0,0 +1,291 @@
+"""Parse NER hàng loạt cho kho CV (backfill) không qua HTTP, cùng pipeline với bert_predict_internal.
+
+Đầu vào là glob/thư mục file .txt (id = đường dẫn) hoặc file JSONL (mỗi dòng một object có
+--text-field, id lấy từ --id-field hoặc số dòng). Model được load một lần rồi fork ra --workers
+process (copy-on-write như serve()); mỗi process nhận từng chunk --chunk-size CV và chạy
+predict_cv_batch (cửa sổ của cả chunk chạy theo batch NER_BATCH_SIZE). Kết quả không đi qua cache.
+
+Kết quả được ghi dần khi từng chunk xong:
+- jsonl: một file, mỗi dòng {"id", "source", "mode", "format", <kết quả như /resume_parsing>} hoặc {"id", "error"}
+- parquet (cần pyarrow): thư mục các file part-*.parquet, cột result là JSON của kết quả
+
+Checkpoint (<output>.checkpoint) ghi lại id của mỗi chunk sau khi kết quả đã fsync xuống đĩa. Chạy
+lại cùng lệnh sẽ bỏ qua các CV đã xong; phần output ghi dở (chưa có trong checkpoint) bị cắt bỏ.
+Nếu output bị xoá hoặc thiếu phần checkpoint đã ghi nhận thì checkpoint bị bỏ và parse lại từ đầu.
+
+Usage:
+    python bulk_parse.py --input "data/*.txt" --output results.jsonl [--workers 4] [--chunk-size 32]
+    python bulk_parse.py --input cvs.jsonl --output results/ --output-format parquet [--mode window]
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+RESULT_FORMATS = ("tokens", "columnar", "entities")
+
+
+def iter_inputs(input_path: str, id_field: str, text_field: str):
+    """Sinh (id, source, text): text là None với file .txt (worker tự đọc file)."""
+    if input_path.endswith(".jsonl"):
+        with open(input_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record_id = str(record.get(id_field, line_number)) if id_field else str(line_number)
+                yield record_id, f"{input_path}:{line_number}", record.get(text_field)
+        return
+
+    pattern = os.path.join(input_path, "*.txt") if os.path.isdir(input_path) else input_path
+    for path in sorted(glob.glob(pattern)):
+        yield path, path, None
+
+
+def load_checkpoint(path: str) -> tuple:
+    """Đọc checkpoint: (tập id đã xong, offset/số part hợp lệ cuối cùng của output).
+
+    Phần sau dòng hợp lệ cuối cùng (dòng ghi dở khi bị dừng giữa chừng) bị cắt khỏi file, để các
+    dòng ghi thêm ở lần chạy này không nối vào sau nó.
+    """
+    done = set()
+    position = 0
+    if not os.path.exists(path):
+        return done, position
+    valid_end = 0
+    with open(path, "r+b") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                break
+            done.update(entry["ids"])
+            position = entry["position"]
+            valid_end += len(line)
+        size = os.fstat(f.fileno()).st_size
+        if valid_end < size:
+            print(f"Dropping {size - valid_end} bytes of torn checkpoint data")
+            f.truncate(valid_end)
+            os.fsync(f.fileno())
+    return done, position
+
+
+# ========== WORKER ==========
+def init_worker():
+    """Chạy trong mỗi process con sau fork: chia thread của torch theo số worker."""
+    import server
+
+    server.configure_worker_threads(forked=True)
+
+
+def parse_chunk(task: tuple) -> list:
+    """Parse một chunk CV, trả về list record theo đúng thứ tự trong chunk."""
+    import server
+
+    chunk, mode, result_format = task
+    records = [{"id": record_id, "source": source, "mode": mode, "format": result_format} for record_id, source, _ in chunk]
+    texts = {}
+    for i, (_, source, text) in enumerate(chunk):
+        try:
+            if text is None:
+                with open(source, "r", encoding="utf-8") as f:
+                    text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            records[i]["error"] = f"Cannot read input: {str(e)}"
+            continue
+        if not isinstance(text, str) or not server.validate_input(text, server.max_input_chars(mode)):
+            records[i]["error"] = "Invalid input text"
+            continue
+        texts[i] = text
+
+    if texts:
+        for i, result in zip(texts, server.predict_cv_batch(list(texts.values()), mode)):
+            if result_format == "entities":
+                records[i]["entities"] = server.build_entities(*result)
+            elif result_format == "columnar":
+                records[i].update(server.build_columnar(*result))
+            else:
+                records[i]["tokens"] = server.build_token_tag_pairs(*result)
+    return records
+
+
+# ========== OUTPUT ==========
+class JsonlWriter:
+    """Ghi record vào một file JSONL; position trong checkpoint là số byte hợp lệ của file."""
+
+    @staticmethod
+    def has_position(path: str, position: int) -> bool:
+        """Output còn đủ position byte mà checkpoint đã ghi nhận hay không."""
+        return position == 0 or (os.path.exists(path) and os.path.getsize(path) >= position)
+
+    def __init__(self, path: str, position: int):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, "a+b")
+        # Bỏ phần ghi sau checkpoint cuối (chunk ghi dở lúc bị dừng)
+        self.file.truncate(position)
+        self.file.seek(position)
+
+    def write(self, records: list) -> int:
+        for record in records:
+            self.file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Ghi mỗi chunk thành một file part-*.parquet; position trong checkpoint là số part đã ghi."""
+
+    @staticmethod
+    def has_position(directory: str, position: int) -> bool:
+        """Output còn đủ position part mà checkpoint đã ghi nhận hay không."""
+        return all(os.path.exists(os.path.join(directory, f"part-{part:06d}.parquet")) for part in range(position))
+
+    def __init__(self, directory: str, position: int):
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is not installed, use --output-format jsonl")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.parts = position
+        # Part không có trong checkpoint là của chunk ghi dở
+        for name in os.listdir(directory):
+            if name.startswith("part-") and int(name[5:].split(".")[0]) >= position:
+                os.remove(os.path.join(directory, name))
+
+    def write(self, records: list) -> int:
+        table = pyarrow.table(
+            {
+                "id": [record["id"] for record in records],
+                "source": [record["source"] for record in records],
+                "mode": [record["mode"] for record in records],
+                "format": [record["format"] for record in records],
+                "error": [record.get("error") for record in records],
+                "result": [
+                    None if "error" in record else json.dumps(
+                        {key: value for key, value in record.items() if key not in ("id", "source", "mode", "format")},
+                        ensure_ascii=False,
+                    )
+                    for record in records
+                ],
+            }
+        )
+        path = os.path.join(self.directory, f"part-{self.parts:06d}.parquet")
+        pyarrow.parquet.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.parts += 1
+        return self.parts
+
+    def close(self):
+        pass
+
+
+def chunked(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline bulk NER parsing with resumable checkpoints")
+    parser.add_argument("--input", required=True, help='Glob hoặc thư mục file .txt, hoặc file .jsonl')
+    parser.add_argument("--output", required=True, help="File .jsonl, hoặc thư mục với --output-format parquet")
+    parser.add_argument("--output-format", default="jsonl", choices=("jsonl", "parquet"))
+    parser.add_argument("--format", default="tokens", choices=RESULT_FORMATS, help="Dạng kết quả như /resume_parsing")
+    parser.add_argument("--mode", default=None, help="Mặc định NER_DEFAULT_MODE")
+    parser.add_argument("--workers", type=int, default=max(1, os.cpu_count() or 1))
+    parser.add_argument("--chunk-size", type=int, default=32, help="Số CV mỗi worker parse trong một lần")
+    parser.add_argument("--id-field", default="id", help="Trường id trong JSONL, rỗng = số dòng")
+    parser.add_argument("--text-field", default="cv", help="Trường nội dung CV trong JSONL")
+    parser.add_argument("--checkpoint", default=None, help="Mặc định <output>.checkpoint")
+    args = parser.parse_args()
+
+    if args.workers < 1 or args.chunk_size < 1:
+        raise ValueError("--workers and --chunk-size must be >= 1")
+    if args.output_format == "parquet" and pyarrow is None:
+        print("pyarrow is not installed, use --output-format jsonl")
+        sys.exit(1)
+
+    # Trước khi import server: chia thread theo số worker, chạy thẳng theo batch (không scheduler),
+    # không ghi kết quả backfill vào cache của server
+    os.environ["NER_WORKERS"] = str(args.workers)
+    os.environ["NER_SCHEDULER"] = "0"
+    os.environ.setdefault("NER_DISK_CACHE", "")
+    os.environ.setdefault("NER_CACHE_MAX_MB", "0")
+    import server
+
+    mode = args.mode or server.DEFAULT_MODE
+    if mode not in server.NER_MODES:
+        raise ValueError(f"--mode must be one of {server.NER_MODES}")
+
+    writer_class = JsonlWriter if args.output_format == "jsonl" else ParquetWriter
+    checkpoint_path = args.checkpoint or args.output.rstrip("/") + ".checkpoint"
+    done, position = load_checkpoint(checkpoint_path)
+    if not writer_class.has_position(args.output, position):
+        # Cắt theo checkpoint lúc này sẽ nối thêm byte rỗng (hoặc để thiếu part): bỏ checkpoint, parse lại từ đầu
+        print(f"{args.output} is missing output recorded in {checkpoint_path}, starting over")
+        os.remove(checkpoint_path)
+        done, position = set(), 0
+    pending = [item for item in iter_inputs(args.input, args.id_field, args.text_field) if item[0] not in done]
+    print(f"{len(done)} CVs already done, {len(pending)} to parse with {args.workers} workers ({mode} mode)")
+    if not pending:
+        sys.exit(0)
+
+    writer = writer_class(args.output, position)
+    tasks = ((chunk, mode, args.format) for chunk in chunked(pending, args.chunk_size))
+    parsed = errors = 0
+    started = time.perf_counter()
+    # fork: process con dùng chung model đã load của process này
+    context = multiprocessing.get_context("fork")
+    with context.Pool(args.workers, initializer=init_worker) as pool, open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        for records in pool.imap_unordered(parse_chunk, tasks):
+            position = writer.write(records)
+            checkpoint.write(json.dumps({"ids": [record["id"] for record in records], "position": position}) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+            parsed += len(records)
+            errors += sum("error" in record for record in records)
+            elapsed = time.perf_counter() - started
+            rate = parsed / elapsed
+            print(
+                f"{parsed}/{len(pending)} CVs ({errors} errors), {rate:.2f} CVs/s, "
+                f"ETA {(len(pending) - parsed) / rate / 60:.1f} min"
+            )
+    writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(
+        json.dumps(
+            {
+                "finished_at": datetime.now().isoformat(),
+                "parsed": parsed,
+                "errors": errors,
+                "elapsed_s": round(elapsed, 1),
+                "cvs_per_s": round(parsed / elapsed, 2),
+                "output": args.output,
+                "checkpoint": checkpoint_path,
+            },
+            indent=2,
+        )
+    )
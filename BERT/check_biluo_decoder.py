@@ -0,0 +1,121 @@
+"""Kiểm tra BiluoDecoder cho cùng kết quả với concatenate_tokens và benchmark hai cách ghép entity.
+Với with_last=True, token từ start tới last_position phải ghép lại đúng bằng text của entity
+(span dùng trong server.build_entities).
+
+Chuỗi tag thử nghiệm lấy từ nhãn ner_resumes/*.json (ner_dataset.labeled_sequences: BILUO theo từ,
+wordpiece sau là X giống lúc train), cộng với các biến thể bị đổi tag ngẫu nhiên và chuỗi tag ngẫu nhiên hoàn toàn.
+Benchmark chạy trên các văn bản tổng hợp từ những chuỗi tag đó.
+
+Usage:
+    python check_biluo_decoder.py [--data "ner_resumes/*.json"] [--mutations 20] [--docs 10000]
+
+Thoát với mã 1 nếu có chuỗi tag cho ra kết quả khác nhau.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+from pytorch_pretrained_bert import BertTokenizer
+
+from concatenate_tokens import BiluoDecoder, concatenate_tokens
+from ner_dataset import labeled_sequences
+from ner_tags import idx2tag, tag2idx
+
+# Không import server để khỏi load model: chỉ cần tokenizer (vocab trong models/) và bảng tag
+MODEL_DIR = os.getenv("NER_MODEL_DIR", "models")
+MAX_LEN = 512  # Như server.MAX_LEN
+entity_decoder = BiluoDecoder(idx2tag)
+
+
+def mutate(tag_ids: list, rng: random.Random) -> list:
+    """Đổi ngẫu nhiên một số tag để phủ các chuỗi BILUO không hợp lệ mà model có thể sinh ra."""
+    mutated = list(tag_ids)
+    for _ in range(rng.randint(1, max(1, len(mutated) // 10))):
+        mutated[rng.randrange(len(mutated))] = rng.randrange(len(idx2tag))
+    return mutated
+
+
+def to_token_list(tokens: list, tag_ids: list) -> list:
+    return [
+        {"token": token, "tag": idx2tag[tag_id], "position": i}
+        for i, (token, tag_id) in enumerate(zip(tokens, tag_ids))
+    ]
+
+
+def check_equivalence(cases: list) -> list:
+    """Trả về list chỉ số các case cho kết quả khác nhau."""
+    mismatches = []
+    for index, (tokens, tag_ids) in enumerate(cases):
+        expected = concatenate_tokens(to_token_list(tokens, tag_ids))
+        spans = entity_decoder.decode(tokens, tag_ids, with_last=True)
+        if entity_decoder.decode(tokens, tag_ids) != expected or [span[:4] for span in spans] != expected:
+            mismatches.append(index)
+        elif any("".join(tokens[start : last + 1]).replace("##", "") != text for text, _, start, _, last in spans):
+            mismatches.append(index)
+    return mismatches
+
+
+def benchmark(docs: list) -> dict:
+    token_lists = [to_token_list(tokens, tag_ids) for tokens, tag_ids in docs]
+
+    started = time.perf_counter()
+    for token_list in token_lists:
+        concatenate_tokens(token_list)
+    reference_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for tokens, tag_ids in docs:
+        entity_decoder.decode(tokens, tag_ids)
+    decoder_s = time.perf_counter() - started
+
+    return {
+        "docs": len(docs),
+        "tokens": sum(len(tokens) for tokens, _ in docs),
+        "concatenate_tokens_ms": round(reference_s * 1000, 2),
+        "biluo_decoder_ms": round(decoder_s * 1000, 2),
+        "speedup": round(reference_s / decoder_s, 2) if decoder_s else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check BiluoDecoder against concatenate_tokens")
+    parser.add_argument("--data", default=os.path.join("ner_resumes", "*.json"))
+    parser.add_argument("--mutations", type=int, default=20, help="Số biến thể đổi tag mỗi CV")
+    parser.add_argument("--random-cases", type=int, default=2000)
+    parser.add_argument("--docs", type=int, default=10000, help="Số văn bản tổng hợp cho benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tokenizer = BertTokenizer.from_pretrained(MODEL_DIR, do_lower_case=False)
+    gold = labeled_sequences(sorted(glob.glob(args.data)), tokenizer, tag2idx, MAX_LEN)
+    if not gold:
+        print(f"No annotations found in {args.data}")
+        sys.exit(1)
+
+    cases = list(gold)
+    for tokens, tag_ids in gold:
+        cases.extend((tokens, mutate(tag_ids, rng)) for _ in range(args.mutations))
+    for _ in range(args.random_cases):
+        tokens, _ = rng.choice(gold)
+        length = rng.randint(0, min(len(tokens), 64))
+        cases.append((tokens[:length], [rng.randrange(len(idx2tag)) for _ in range(length)]))
+
+    mismatches = check_equivalence(cases)
+    print(f"Checked {len(cases)} tag sequences ({len(gold)} gold), {len(mismatches)} mismatches")
+    for index in mismatches[:10]:
+        tokens, tag_ids = cases[index]
+        print(f"  case {index}: {[idx2tag[tag_id] for tag_id in tag_ids][:40]}")
+
+    docs = []
+    for _ in range(args.docs):
+        tokens, tag_ids = rng.choice(gold)
+        docs.append((tokens, mutate(tag_ids, rng) if rng.random() < 0.5 else tag_ids))
+    print(json.dumps(benchmark(docs), indent=2))
+
+    if mismatches:
+        sys.exit(1)
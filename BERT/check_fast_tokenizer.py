@@ -0,0 +1,100 @@
+"""Kiểm tra fast tokenizer (fast_tokenize_batch) cho ra cùng chuỗi token với custom_tokenize
+trên corpus data/r*.txt và các văn bản chứa special token (SPECIAL_TOKEN_TEXTS), và micro-benchmark
+hai cách tokenize.
+
+Usage:
+    python check_fast_tokenizer.py [--data "data/r*.txt"] [--repeat 5]
+
+Thoát với mã 1 nếu có văn bản cho ra chuỗi token khác nhau.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import server
+
+# CV có thể chứa nguyên văn "[CLS]", "[SEP]"...: chỉ từ đứng riêng được giữ nguyên, còn lại tách như chữ thường
+SPECIAL_TOKEN_TEXTS = (
+    "[CLS]",
+    "[CLS] Python [SEP]",
+    "[CLS]é9 x[SEP]y",
+    "Skills: [MASK]. [UNK], [PAD]-",
+    "中[UNK]中 @中[SEP]",
+    "[cls] [ CLS ] [[SEP]] [MASK",
+    "john[CLS]@gmail.com [SEP]github.com/john",
+)
+
+
+def check_equivalence(texts: list, names: list) -> list:
+    """Trả về list (tên file, vị trí token khác đầu tiên) cho các văn bản không khớp."""
+    mismatches = []
+    for name, text, (fast_tokens, offsets) in zip(names, texts, server.fast_tokenize_batch(texts)):
+        reference = server.custom_tokenize(text)
+        if fast_tokens != reference:
+            first = next(
+                (i for i, (a, b) in enumerate(zip(fast_tokens, reference)) if a != b),
+                min(len(fast_tokens), len(reference)),
+            )
+            mismatches.append((name, first))
+            continue
+
+        # Offset phải trỏ về đúng đoạn văn bản của token (bỏ tiền tố "##")
+        for token, (start, end) in zip(fast_tokens, offsets):
+            piece = token[2:] if token.startswith("##") else token
+            if token != "[UNK]" and text[start:end] != piece:
+                mismatches.append((name, f"offset {start}:{end} for {token!r}"))
+                break
+    return mismatches
+
+
+def benchmark(texts: list, repeat: int) -> dict:
+    def best_of(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    python_s = best_of(lambda: [server.custom_tokenize(text) for text in texts])
+    fast_s = best_of(lambda: server.fast_tokenize_batch(texts))
+    return {
+        "texts": len(texts),
+        "custom_tokenize_ms": round(python_s * 1000, 2),
+        "fast_tokenize_batch_ms": round(fast_s * 1000, 2),
+        "speedup": round(python_s / fast_s, 2) if fast_s else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check fast tokenizer equivalence and speed")
+    parser.add_argument("--data", default=os.path.join("data", "r*.txt"))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if server.fast_tokenizer is None:
+        print("Fast tokenizer is not available (install tokenizers, NER_FAST_TOKENIZER=1)")
+        sys.exit(1)
+
+    paths = sorted(glob.glob(args.data))
+    names = [os.path.basename(path) for path in paths]
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(server.preprocess_text(f.read()))
+
+    texts.extend(server.preprocess_text(text) for text in SPECIAL_TOKEN_TEXTS)
+    names.extend(repr(text) for text in SPECIAL_TOKEN_TEXTS)
+
+    mismatches = check_equivalence(texts, names)
+    print(f"Checked {len(texts)} texts, {len(mismatches)} mismatches")
+    for name, where in mismatches:
+        print(f"  {name}: first difference at {where}")
+
+    print(benchmark(texts, args.repeat))
+
+    if mismatches:
+        sys.exit(1)
+    print("OK")
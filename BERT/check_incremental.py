@@ -0,0 +1,126 @@
+"""Kiểm tra chế độ "incremental": sửa một dòng CV rồi parse lại chỉ được chạy model cho các cửa sổ
+bị đổi, và kết quả phải giống hệt parse từ đầu (cache trống) văn bản đã sửa.
+
+Với mỗi CV trong data/r*.txt: parse lần đầu, sửa một dòng ngẫu nhiên (thêm từ, xoá từ hoặc thêm
+dòng mới), parse lại. Báo cáo tỉ lệ cửa sổ phải chạy lại, thời gian parse lại so với parse đầy đủ
+và độ trùng tag giữa "incremental" và "window" (cái giá của cửa sổ ngắn hơn).
+
+Usage:
+    NER_DISK_CACHE= python check_incremental.py [--data "data/r*.txt"] [--limit 50]
+
+Thoát với mã 1 nếu có CV cho kết quả khác với parse từ đầu.
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+import server
+
+EDITS = ("insert_word", "delete_word", "add_line")
+
+
+def edit_one_line(text: str, rng: random.Random) -> tuple:
+    """Sửa một dòng không rỗng chọn ngẫu nhiên, trả về (văn bản mới, loại sửa)."""
+    lines = text.split("\n")
+    candidates = [i for i, line in enumerate(lines) if line.split()] or [0]
+    index = rng.choice(candidates)
+    words = lines[index].split()
+    edit = rng.choice(EDITS)
+    if edit == "insert_word" or (edit == "delete_word" and len(words) < 2):
+        words.insert(rng.randint(0, len(words)), "Kubernetes")
+        edit = "insert_word"
+    elif edit == "delete_word":
+        del words[rng.randrange(len(words))]
+    else:
+        lines.insert(index + 1, "Certified Scrum Master, 2021")
+    lines[index] = " ".join(words)
+    return "\n".join(lines), edit
+
+
+def reset_caches():
+    server.memory_cache = server.MemoryResultCache(int(server.MEMORY_CACHE_MAX_MB * 1024 * 1024))
+
+
+class CountingInference:
+    """Bọc server.run_inference để đếm số cửa sổ thực sự chạy model."""
+
+    def __init__(self):
+        self.run_inference = server.run_inference
+        self.sequences = 0
+
+    def __call__(self, token_sequences: list) -> list:
+        self.sequences += len(token_sequences)
+        return self.run_inference(token_sequences)
+
+
+def same_result(left: tuple, right: tuple) -> bool:
+    return (
+        list(left[0]) == list(right[0])
+        and np.array_equal(left[1], right[1])
+        and np.array_equal(left[2], right[2])
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check incremental re-parse against a cold parse")
+    parser.add_argument("--data", default=os.path.join("data", "r*.txt"))
+    parser.add_argument("--limit", type=int, default=50, help="Số CV tối đa, 0 = tất cả")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    paths = sorted(glob.glob(args.data))
+    if args.limit:
+        paths = paths[: args.limit]
+    if not paths:
+        print(f"No files found in {args.data}")
+        sys.exit(1)
+
+    counter = CountingInference()
+    server.run_inference = counter
+    server.predict_cv_batch(["warmup"], "incremental")
+
+    mismatches = []
+    windows_total = windows_rerun = 0
+    full_s = reparse_s = 0.0
+    agreement = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            original = f.read()
+        edited, edit = edit_one_line(original, rng)
+
+        reset_caches()
+        started = time.perf_counter()
+        server.predict_cv_batch([original], "incremental")
+        full_s += time.perf_counter() - started
+
+        counter.sequences = 0
+        started = time.perf_counter()
+        incremental = server.predict_cv_batch([edited], "incremental")[0]
+        reparse_s += time.perf_counter() - started
+        windows_rerun += counter.sequences
+        windows_total += len(server.prepare_windows(edited, "incremental")[1])
+
+        reset_caches()
+        cold = server.predict_cv_batch([edited], "incremental")[0]
+        if not same_result(incremental, cold):
+            mismatches.append((path, edit))
+
+        # Cùng chuỗi token với "window" (không cắt bớt), chỉ khác cách chia cửa sổ
+        _, window_ids, _ = server.predict_cv_batch([edited], "window")[0]
+        agreement.append(float(np.mean(np.asarray(window_ids) == np.asarray(cold[1]))))
+
+    print(f"CVs: {len(paths)}, mismatches vs cold parse: {len(mismatches)}")
+    print(f"Windows re-run after a one-line edit: {windows_rerun}/{windows_total} ({windows_rerun / max(windows_total, 1):.1%})")
+    print(f"Full parse: {full_s * 1000 / len(paths):.1f} ms/CV, re-parse: {reparse_s * 1000 / len(paths):.1f} ms/CV ({reparse_s / max(full_s, 1e-9):.1%})")
+    print(f"Tag agreement with window mode: {np.mean(agreement):.4f}")
+    for path, edit in mismatches[:10]:
+        print(f"  {path}: {edit}")
+
+    if mismatches:
+        sys.exit(1)
@@ -0,0 +1,78 @@
+"""Kiểm tra nhãn BILUO do ner_dataset dựng: entity nhiều từ (NAME) và một từ (EMAIL, GPA) phải mang tag
+khác "O", với cả tokenizer của spaCy (nếu đã cài) và WORD_RE. Sau đó đếm trên ner_resumes/*.json số
+entity của từng nhãn còn giữ được tag (từ đầu mang B- hoặc U-).
+
+Usage:
+    python check_ner_dataset.py [--data "ner_resumes/*.json"]
+
+Thoát với mã 1 nếu một case sai hoặc có nhãn trong dữ liệu không giữ được entity nào.
+"""
+import argparse
+import glob
+import os
+import sys
+from collections import Counter
+
+import ner_dataset
+from ner_tags import tag2idx
+
+CONTENT = "Nguyen Van An\nEmail: an.nguyen@gmail.com\nGPA: 3.5/4.0\nSkills: Python"
+# (văn bản của entity, nhãn, tag mong đợi theo từng từ)
+CASES = (
+    ("Nguyen Van An", "NAME", ["B-NAME", "I-NAME", "L-NAME"]),
+    ("an.nguyen@gmail.com", "EMAIL", ["U-EMAIL"]),
+    ("3.5/4.0", "GPA", ["U-GPA"]),
+    ("Python", "TECHSTACK_SKILLS", ["U-TECHSTACK_SKILLS"]),
+)
+
+
+def check_cases(label: str) -> int:
+    entities = [(CONTENT.index(text), CONTENT.index(text) + len(text), name) for text, name, _ in CASES]
+    tagged = ner_dataset.word_biluo_tags(CONTENT, entities, tag2idx)
+    words = ner_dataset.split_words(CONTENT)
+    failures = 0
+    for text, name, expected in CASES:
+        start = CONTENT.index(text)
+        tags = [tag for (word, tag), (_, word_start, word_end) in zip(tagged, words) if start <= word_start < start + len(text)]
+        if tags != expected:
+            failures += 1
+            print(f"  [{label}] {name} {text!r}: expected {expected}, got {tags}")
+    return failures
+
+
+def kept_entities(paths: list) -> tuple:
+    total = Counter()
+    kept = Counter()
+    for path in paths:
+        for content, entities in ner_dataset.load_annotation_file(path):
+            total.update(label.strip() for _, _, label in entities)
+            for _, tag in ner_dataset.word_biluo_tags(content, entities, tag2idx):
+                if tag[:2] in ("B-", "U-"):
+                    kept[tag[2:]] += 1
+    return total, kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check BILUO labels built by ner_dataset")
+    parser.add_argument("--data", default=os.path.join("ner_resumes", "*.json"))
+    args = parser.parse_args()
+
+    failures = 0
+    if ner_dataset.spacy is not None:
+        failures += check_cases("spacy")
+    spacy, ner_dataset.spacy = ner_dataset.spacy, None
+    try:
+        failures += check_cases("regex")
+    finally:
+        ner_dataset.spacy = spacy
+    print(f"Checked {len(CASES)} entities, {failures} failed")
+
+    total, kept = kept_entities(sorted(glob.glob(args.data)))
+    lost = [label for label in total if not kept[label]]
+    for label in sorted(total):
+        print(f"  {label}: {kept[label]}/{total[label]} entities tagged")
+    if lost:
+        print(f"Labels with no tagged entity: {lost}")
+
+    if failures or lost:
+        sys.exit(1)
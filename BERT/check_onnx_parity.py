@@ -0,0 +1,92 @@
+"""So sánh output của NER_BACKEND=onnx với PyTorch trên corpus data/r*.txt.
+
+Usage:
+    python check_onnx_parity.py [--onnx models/ner_model.onnx] [--mode window] [--min-agreement 0.999]
+
+Thoát với mã 1 nếu tỉ lệ tag trùng khớp thấp hơn --min-agreement.
+"""
+import argparse
+import glob
+import os
+import sys
+
+# Model tham chiếu là checkpoint PyTorch gốc
+os.environ["NER_BACKEND"] = "torch"
+
+import server
+
+
+def predict_with(forward, token_sequences: list) -> list:
+    """Chạy predict_token_batch với một hàm forward cụ thể."""
+    return server.predict_token_batch(token_sequences, forward=forward)
+
+
+def check_parity(onnx_path: str, data_glob: str, mode: str) -> dict:
+    session = server.load_onnx_session(onnx_path)
+
+    def torch_fn(ids, masks):
+        return server.torch_forward(server.bert_model, ids, masks)
+
+    def onnx_fn(ids, masks):
+        return server.onnx_forward(session, ids, masks)
+
+    files = sorted(glob.glob(data_glob))
+    total_tokens = 0
+    mismatched_tokens = 0
+    max_conf_diff = 0.0
+    mismatched_files = []
+
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            cv_data = f.read()
+        if not server.validate_input(cv_data, server.max_input_chars(mode)):
+            continue
+
+        content_tokens, windows = server.prepare_windows(cv_data, mode)
+        token_sequences = [window_tokens for _, window_tokens in windows]
+        torch_pairs = server.build_token_tag_pairs(
+            *server.merge_window_predictions(content_tokens, windows, predict_with(torch_fn, token_sequences))
+        )
+        onnx_pairs = server.build_token_tag_pairs(
+            *server.merge_window_predictions(content_tokens, windows, predict_with(onnx_fn, token_sequences))
+        )
+
+        diff = sum(a["tag"] != b["tag"] for a, b in zip(torch_pairs, onnx_pairs))
+        total_tokens += len(torch_pairs)
+        mismatched_tokens += diff
+        max_conf_diff = max(
+            max_conf_diff,
+            max(abs(a["confidence"] - b["confidence"]) for a, b in zip(torch_pairs, onnx_pairs)),
+        )
+        if diff:
+            mismatched_files.append((os.path.basename(path), diff))
+
+    return {
+        "files": len(files),
+        "tokens": total_tokens,
+        "mismatched_tokens": mismatched_tokens,
+        "tag_agreement": 1.0 - mismatched_tokens / max(total_tokens, 1),
+        "max_confidence_diff": round(float(max_conf_diff), 6),
+        "mismatched_files": mismatched_files,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check ONNX vs PyTorch NER parity")
+    parser.add_argument("--onnx", default=server.ONNX_MODEL_PATH)
+    parser.add_argument("--data", default=os.path.join("data", "r*.txt"))
+    parser.add_argument("--mode", default="truncate", choices=server.NER_MODES)
+    parser.add_argument("--min-agreement", type=float, default=0.999)
+    args = parser.parse_args()
+
+    report = check_parity(args.onnx, args.data, args.mode)
+    print(f"Files: {report['files']}, tokens: {report['tokens']}")
+    print(f"Tag agreement: {report['tag_agreement']:.6f} ({report['mismatched_tokens']} mismatched tokens)")
+    print(f"Max confidence diff: {report['max_confidence_diff']}")
+    for name, diff in report["mismatched_files"]:
+        print(f"  {name}: {diff} mismatched tokens")
+
+    if report["tag_agreement"] < args.min_agreement:
+        print(f"FAILED: agreement below {args.min_agreement}")
+        sys.exit(1)
+    print("OK")
@@ -0,0 +1,140 @@
+"""Kiểm tra preprocess_text một lần quét so với cách cũ (ba lần re.finditer rồi nối chuỗi theo từng match)
+và benchmark hai cách trên data/r*.txt.
+
+- Văn bản không có match chồng nhau: kết quả phải giống hệt cách cũ.
+- Mọi văn bản (kể cả có email chứa số điện thoại, GitHub URL dính email...): không ký tự nào bị
+  lặp hay mất, và offset map trỏ đúng về ký tự gốc.
+
+Usage:
+    python check_preprocess.py [--data "data/r*.txt"] [--rounds 5] [--long-factor 50]
+
+Thoát với mã 1 nếu có văn bản sai.
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import time
+
+import server
+
+LEGACY_PATTERNS = (
+    r"([a-zA-Z0-9._-]+@[a-zA-Z0-9._-]+\.[a-zA-Z0-9._-]+)",
+    r"(\d{3}[-.]?\d{3}[-.]?\d{4}|\d{10})",
+    r"(github\.com/[a-zA-Z0-9-]+)",
+)
+
+# Đoạn chèn thêm để phủ các trường hợp chồng nhau và khoảng trắng lạ
+SNIPPETS = (
+    "john.doe@gmail.com",
+    "0912345678@company.vn",
+    "github.com/nguyen-van-a",
+    "github.com/abc@mail.com",
+    "090.123.4567",
+    "phone:0987654321,",
+    "12345678901234567890",
+    "  \t\n ",
+    "  ",
+)
+
+
+def legacy_matches(text: str) -> list:
+    text = " ".join(text.split())
+    return [match.span() for pattern in LEGACY_PATTERNS for match in re.finditer(pattern, text)]
+
+
+def legacy_preprocess(text: str) -> str:
+    """preprocess_text trước khi có bản một lần quét."""
+    text = " ".join(text.split())
+    replacements = []
+    for pattern in LEGACY_PATTERNS:
+        for match in re.finditer(pattern, text):
+            replacements.append((match.start(), match.end(), f" {match.group()} "))
+    replacements.sort(key=lambda x: x[0], reverse=True)
+    for start, end, replacement in replacements:
+        text = text[:start] + replacement + text[end:]
+    return text
+
+
+def has_overlap(spans: list) -> bool:
+    spans = sorted(spans)
+    return any(spans[i][1] > spans[i + 1][0] for i in range(len(spans) - 1))
+
+
+def check_text(text: str) -> list:
+    """List lỗi của một văn bản (rỗng nếu đúng)."""
+    errors = []
+    processed = server.preprocess_text(text)
+    if not has_overlap(legacy_matches(text)) and processed != legacy_preprocess(text):
+        errors.append("differs from legacy output")
+    if "".join(processed.split()) != "".join(text.split()):
+        errors.append("characters duplicated or lost")
+
+    with_offsets, offsets = server.preprocess_text_with_offsets(text)
+    if with_offsets != processed or len(offsets) != len(processed):
+        errors.append("offset variant differs")
+    elif any(not char.isspace() and text[offset] != char for char, offset in zip(processed, offsets.tolist())):
+        errors.append("offset map points to wrong characters")
+    return errors
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    """Chèn các snippet vào vị trí ngẫu nhiên, có khi dính liền với chữ xung quanh."""
+    for _ in range(rng.randint(1, 8)):
+        position = rng.randint(0, len(text))
+        text = text[:position] + rng.choice(SNIPPETS) + text[position:]
+    return text
+
+
+def timed(function, texts: list, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        function(texts)
+    return (time.perf_counter() - started) / rounds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and benchmark the single-pass preprocess_text")
+    parser.add_argument("--data", default=os.path.join("data", "r*.txt"))
+    parser.add_argument("--mutations", type=int, default=5, help="Số biến thể chèn snippet cho mỗi CV")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--long-factor", type=int, default=50, help="Số CV ghép thành văn bản dài, <= 1 để bỏ qua")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = []
+    for path in sorted(glob.glob(args.data)):
+        with open(path, "r", encoding="utf-8") as f:
+            corpus.append(f.read())
+    if not corpus:
+        print(f"No files found in {args.data}")
+        sys.exit(1)
+
+    cases = corpus + [mutate(text, rng) for text in corpus for _ in range(args.mutations)]
+    cases += ["", "   ", " ".join(SNIPPETS), "".join(SNIPPETS)]
+    failures = [(index, errors) for index, text in enumerate(cases) if (errors := check_text(text))]
+    overlapping = sum(has_overlap(legacy_matches(text)) for text in cases)
+    print(f"Checked {len(cases)} texts ({overlapping} with overlapping matches), {len(failures)} failed")
+    for index, errors in failures[:10]:
+        print(f"  case {index}: {', '.join(errors)}")
+
+    # Cách cũ copy cả chuỗi cho mỗi match nên chậm dần theo độ dài văn bản: thêm CV ghép dài
+    workloads = [("corpus", corpus)]
+    if args.long_factor > 1:
+        workloads.append((f"long_x{args.long_factor}", ["\n".join(corpus[: args.long_factor])]))
+    for name, texts in workloads:
+        legacy_s = timed(lambda texts: [legacy_preprocess(text) for text in texts], texts, args.rounds)
+        single_s = timed(lambda texts: [server.preprocess_text(text) for text in texts], texts, args.rounds)
+        batch_s = timed(server.preprocess_texts, texts, args.rounds)
+        offsets_s = timed(lambda texts: [server.preprocess_text_with_offsets(text) for text in texts], texts, args.rounds)
+        print(f"{name}: {len(texts)} CVs, {sum(map(len, texts))} chars, average of {args.rounds} rounds")
+        print(f"  legacy:         {legacy_s * 1000:.2f} ms")
+        print(f"  single pass:    {single_s * 1000:.2f} ms ({legacy_s / single_s:.2f}x)")
+        print(f"  batch:          {batch_s * 1000:.2f} ms ({legacy_s / batch_s:.2f}x)")
+        print(f"  with offsets:   {offsets_s * 1000:.2f} ms ({legacy_s / offsets_s:.2f}x)")
+
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,54 @@
+"""Kiểm tra chế độ "segment" chỉ cắt tại "." đứng riêng thành một từ, không cắt trong số thập phân,
+tên công nghệ hay tên bằng cấp ("GPA 3.5", "Node.js", "B.Sc"), với cả fast tokenizer và custom_tokenize.
+
+Usage:
+    python check_segments.py
+
+Thoát với mã 1 nếu có văn bản bị chia sai.
+"""
+import sys
+
+import server
+
+# (văn bản, số đoạn mong đợi)
+CASES = (
+    ("GPA 3.5 / 4.0", 1),
+    ("Skills: Node.js , React.js and Vue.js", 1),
+    ("B.Sc in Computer Science , M.Sc 2020", 1),
+    ("Version 1.2.3 released", 1),
+    ("Email john.doe@gmail.com , github.com/john.doe", 1),
+    ("Python developer . GPA 3.5 . Node.js", 3),
+    ("Java . ##hash tag", 2),
+    (". leading period", 1),
+    ("trailing period .", 2),
+)
+
+
+def segment_texts(windows: list) -> list:
+    return [" ".join(window[1:-1]) for _, window in windows]
+
+
+def check_cases(label: str) -> int:
+    failures = 0
+    for text, expected in CASES:
+        tokens, windows = server.prepare_windows(text, "segment")
+        covered = [token for _, window in windows for token in window[1:-1]]
+        if len(windows) != expected or covered != list(tokens):
+            failures += 1
+            print(f"  [{label}] {text!r}: expected {expected} segments, got {segment_texts(windows)}")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = 0
+    if server.fast_tokenizer is not None:
+        failures += check_cases("fast")
+    fast_tokenizer, server.fast_tokenizer = server.fast_tokenizer, None
+    try:
+        failures += check_cases("custom")
+    finally:
+        server.fast_tokenizer = fast_tokenizer
+
+    print(f"Checked {len(CASES)} texts, {failures} failed")
+    if failures:
+        sys.exit(1)
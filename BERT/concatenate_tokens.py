@@ -121,3 +121,149 @@ def concatenate_tokens(token_list):
         )
 
     return entities
+
+
+# Loại tag dùng trong BiluoDecoder
+_SKIP, _B, _I, _L, _U, _X, _O, _OTHER = range(8)
+# Trạng thái của BiluoDecoder
+_IDLE, _OPEN, _SCAN, _L_TAIL, _U_TAIL = range(5)
+
+
+class BiluoDecoder:
+    """
+    Decoder BILUO một lượt (linear-time) trên mảng tag id
+
+    Cho kết quả giống hệt concatenate_tokens (kể cả cách chọn end position khi entity
+    không có L-), nhưng mỗi token chỉ được xét một lần và chuỗi entity chỉ được nối
+    một lần khi entity kết thúc.
+
+    Args:
+        idx2tag: Dict tag id -> tag (ví dụ idx2tag trong server.py)
+    """
+
+    def __init__(self, idx2tag):
+        prefix_kinds = {"B-": _B, "I-": _I, "L-": _L, "U-": _U}
+        size = max(idx2tag) + 1
+        self.kinds = [_OTHER] * size
+        self.types = [None] * size
+        self.tag2idx = {}
+
+        for idx, tag in idx2tag.items():
+            self.tag2idx[tag] = idx
+            if tag in ("[CLS]", "[SEP]"):
+                self.kinds[idx] = _SKIP
+            elif tag == "X":
+                self.kinds[idx] = _X
+            elif tag == "O":
+                self.kinds[idx] = _O
+            elif tag[:2] in prefix_kinds:
+                self.kinds[idx] = prefix_kinds[tag[:2]]
+                self.types[idx] = tag[2:]
+
+    def decode(self, tokens, tag_ids, positions=None, with_last=False):
+        """
+        Args:
+            tokens: List token (wordpiece)
+            tag_ids: List hoặc mảng numpy tag id, cùng độ dài với tokens
+            positions: Vị trí của từng token, mặc định là chỉ số trong tokens
+            with_last: Thêm last_position: vị trí token cuối của entity_text. end_position giữ
+                cách tính của concatenate_tokens (B- I-... không có L- kết thúc ngay trước I- đầu tiên)
+
+        Returns:
+            List of tuples: (entity_text, entity_tag, start_position, end_position[, last_position])
+        """
+        if hasattr(tag_ids, "tolist"):
+            tag_ids = tag_ids.tolist()
+        if positions is None:
+            positions = range(len(tokens))
+
+        kinds = self.kinds
+        types = self.types
+        entities = []
+
+        def emit(start, stop, end_position):
+            entities.append(
+                (
+                    "".join(tokens[start:stop]).replace("##", ""),
+                    entity_type,
+                    positions[start],
+                    end_position,
+                    positions[stop - 1],
+                )
+            )
+
+        state = _IDLE
+        entity_start = entity_stop = 0
+        entity_type = None
+        first_inside = -1
+
+        for i, tag_id in enumerate(tag_ids):
+            kind = kinds[tag_id]
+
+            if state == _SCAN:
+                # Đang đọc tiếp entity sau B-: nhận I- cùng loại và X, kết thúc ở L- cùng loại
+                if kind == _X or (kind == _I and types[tag_id] == entity_type):
+                    if kind == _I and first_inside < 0:
+                        first_inside = i
+                    continue
+                if kind == _L and types[tag_id] == entity_type:
+                    state = _L_TAIL
+                    continue
+                # Không có L-: entity kết thúc trước token i. Nếu có I- thì entity đóng tại
+                # token ngay trước I- đầu tiên, nếu không thì vẫn mở cho tới tag kế tiếp
+                entity_stop = i
+                if first_inside >= 0:
+                    emit(entity_start, i, positions[first_inside - 1])
+                    state = _IDLE
+                else:
+                    state = _OPEN
+            elif state == _L_TAIL or state == _U_TAIL:
+                # Gom các X ngay sau L- hoặc U-
+                if kind == _X:
+                    continue
+                emit(entity_start, i, positions[i - 1])
+                state = _IDLE
+
+            if kind == _SKIP or kind == _X or kind == _O:
+                continue
+
+            if kind == _B:
+                if state == _OPEN:
+                    emit(entity_start, entity_stop, positions[i - 1])
+                state = _SCAN
+                entity_start = i
+                entity_type = types[tag_id]
+                first_inside = -1
+            elif kind == _U:
+                # Giống concatenate_tokens: entity đang mở bị bỏ, không được lưu
+                state = _U_TAIL
+                entity_start = i
+                entity_type = types[tag_id]
+            elif state == _OPEN:
+                emit(entity_start, entity_stop, positions[i - 1])
+                state = _IDLE
+
+        if tokens:
+            last_position = positions[len(tokens) - 1]
+            if state == _SCAN:
+                emit(
+                    entity_start,
+                    len(tokens),
+                    positions[first_inside - 1] if first_inside >= 0 else last_position,
+                )
+            elif state == _OPEN:
+                emit(entity_start, entity_stop, last_position)
+            elif state != _IDLE:
+                emit(entity_start, len(tokens), last_position)
+
+        if with_last:
+            return entities
+        return [entity[:4] for entity in entities]
+
+    def decode_token_list(self, token_list):
+        """Cùng input với concatenate_tokens: list dict có 'token', 'tag', 'position'."""
+        return self.decode(
+            [item["token"] for item in token_list],
+            [self.tag2idx[item["tag"]] for item in token_list],
+            [item["position"] for item in token_list],
+        )
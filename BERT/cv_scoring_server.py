@@ -15,6 +15,7 @@ from langdetect import detect
 import logging
 import google.generativeai as genai
 from pathlib import Path
+from request_profiler import install_request_profiler
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -28,6 +29,15 @@ CORS(app)
 
 load_dotenv()
 os.environ["TRANSFORMERS_OFFLINE"] = "1"
+# Profiling theo request: header X-Profile kèm SCORING_PROFILE_TOKEN, hoặc lấy mẫu ngẫu nhiên
+install_request_profiler(
+    app,
+    admin_token=os.getenv("SCORING_PROFILE_TOKEN", ""),
+    profile_dir=os.getenv("SCORING_PROFILE_DIR", "profiles"),
+    sample_rate=float(os.getenv("SCORING_PROFILE_SAMPLE_RATE", "0")),
+    log=log.info,
+    max_files=int(os.getenv("SCORING_PROFILE_MAX_FILES", "100")),
+)
 log.info("Loading SentenceTransformer model for scoring...")
 try:
     model_dir = Path(__file__).resolve().parent / "finetune-score-cv-jd"
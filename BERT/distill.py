@@ -0,0 +1,252 @@
+"""Distill model NER (teacher, trong models/) thành student ít layer hơn, chạy được trên CPU.
+
+Student học nhãn gốc của ner_resumes/*.json (chia câu giống lúc train) cùng soft label của teacher
+trên cả các câu đó lẫn corpus không nhãn data/r*.txt (chia đoạn như mode "segment"):
+    loss = alpha * CE(nhãn gốc) + (1 - alpha) * T^2 * KL(student/T || teacher/T)
+Student giữ nguyên hidden size và tag2idx, được khởi tạo từ embedding, classifier và các layer
+cách đều của teacher, lưu ở định dạng server.py load được (NER_MODEL_DIR=models/student).
+
+Một phần file ner_resumes được giữ lại để so sánh teacher và student (entity F1, tốc độ);
+report lưu cùng student trong distillation_report.json.
+
+Usage:
+    python distill.py [--layers 4] [--epochs 3] [--max-unlabeled 0] [--output models/student]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import shutil
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# eval_quantized đặt NER_BACKEND=torch trước khi import server: teacher là checkpoint full-precision
+from eval_quantized import entity_counts, load_annotations, predict_pairs, prf
+import server
+from ner_dataset import labeled_sequences
+from pytorch_pretrained_bert import BertConfig, BertForTokenClassification
+
+
+def teacher_logits(teacher, sequences: list, batch_size: int) -> list:
+    """Logits của teacher cho từng chuỗi token (float16 để tiết kiệm bộ nhớ)."""
+    results = []
+    for start in range(0, len(sequences), batch_size):
+        batch = sequences[start : start + batch_size]
+        input_ids = server.pad_token_ids(
+            [server.tokens_to_ids(tokens) for tokens in batch], max(len(tokens) for tokens in batch)
+        )
+        logits = server.torch_forward(teacher, input_ids, (input_ids > 0).astype(np.float32))
+        results.extend(logits[b, : len(tokens)].astype(np.float16) for b, tokens in enumerate(batch))
+    return results
+
+
+def build_student(teacher, num_layers: int):
+    """Student cùng hidden size với teacher, lấy num_layers layer cách đều của teacher làm khởi tạo."""
+    config_dict = json.loads(
+        BertConfig.from_json_file(os.path.join(server.bert_out_address, "config.json")).to_json_string()
+    )
+    teacher_layers = config_dict["num_hidden_layers"]
+    if not 1 <= num_layers <= teacher_layers:
+        raise ValueError(f"--layers must be in 1..{teacher_layers}")
+    config_dict["num_hidden_layers"] = num_layers
+    config = BertConfig.from_dict(config_dict)
+    student = BertForTokenClassification(config, num_labels=len(server.tag2idx))
+
+    step = teacher_layers / num_layers
+    layer_map = {str(i): str(int(round((i + 1) * step)) - 1) for i in range(num_layers)}
+    teacher_state = teacher.state_dict()
+    student_state = {}
+    for name in student.state_dict():
+        source = name
+        if name.startswith("bert.encoder.layer."):
+            index = name.split(".")[3]
+            source = name.replace(f"bert.encoder.layer.{index}.", f"bert.encoder.layer.{layer_map[index]}.", 1)
+        student_state[name] = teacher_state[source].clone()
+    student.load_state_dict(student_state)
+    return student, config
+
+
+def make_batches(examples: list, batch_size: int, rng: random.Random) -> list:
+    """Gom ví dụ có độ dài gần nhau vào cùng batch (ít padding), rồi xáo thứ tự batch."""
+    order = sorted(range(len(examples)), key=lambda i: len(examples[i][0]) + rng.random())
+    batches = [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+    rng.shuffle(batches)
+    return batches
+
+
+def collate(examples: list, indices: list) -> tuple:
+    """Pad một batch: input ids, attention mask, nhãn gốc (-100 = bỏ qua) và logits của teacher."""
+    batch_len = max(len(examples[i][0]) for i in indices)
+    num_labels = len(server.tag2idx)
+    input_ids = np.zeros((len(indices), batch_len), dtype=np.int64)
+    labels = np.full((len(indices), batch_len), -100, dtype=np.int64)
+    soft = np.zeros((len(indices), batch_len, num_labels), dtype=np.float32)
+    for b, i in enumerate(indices):
+        tokens, tag_ids, logits = examples[i]
+        input_ids[b, : len(tokens)] = server.tokens_to_ids(tokens)
+        if tag_ids is not None:
+            labels[b, : len(tokens)] = tag_ids
+        soft[b, : len(tokens)] = logits
+    masks = (input_ids > 0).astype(np.float32)
+    return (
+        torch.from_numpy(input_ids),
+        torch.from_numpy(masks),
+        torch.from_numpy(labels),
+        torch.from_numpy(soft),
+    )
+
+
+def distillation_loss(logits, masks, labels, soft, temperature: float, alpha: float):
+    kd = F.kl_div(
+        F.log_softmax(logits / temperature, dim=-1),
+        F.softmax(soft / temperature, dim=-1),
+        reduction="none",
+    ).sum(-1)
+    kd = (kd * masks).sum() / masks.sum() * temperature ** 2
+    if (labels != -100).any():
+        ce = F.cross_entropy(logits.reshape(-1, logits.size(-1)), labels.reshape(-1), ignore_index=-100)
+        return alpha * ce + (1 - alpha) * kd
+    return kd
+
+
+def train(student, examples: list, args) -> list:
+    rng = random.Random(args.seed)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=args.lr)
+    history = []
+    student.train()
+    for epoch in range(args.epochs):
+        started = time.perf_counter()
+        losses = []
+        for indices in make_batches(examples, args.batch_size, rng):
+            input_ids, masks, labels, soft = collate(examples, indices)
+            logits = student(input_ids, token_type_ids=None, attention_mask=masks)
+            loss = distillation_loss(logits, masks, labels, soft, args.temperature, args.alpha)
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            losses.append(loss.item())
+        history.append(
+            {
+                "epoch": epoch + 1,
+                "loss": round(float(np.mean(losses)), 4),
+                "seconds": round(time.perf_counter() - started, 1),
+            }
+        )
+        print(f"Epoch {epoch + 1}/{args.epochs}: {history[-1]}")
+    student.eval()
+    return history
+
+
+def evaluate(models: dict, eval_files: list, mode: str) -> dict:
+    """Entity P/R/F1 so với nhãn gốc và thời gian chạy trung bình mỗi CV của từng model."""
+    samples = [sample for path in eval_files for sample in load_annotations(path)]
+    gold_total = sum(sum(gold.values()) for _, gold in samples)
+    report = {}
+    for name, model in models.items():
+        forward = lambda ids, masks, model=model: server.torch_forward(model, ids, masks)
+        true_positive = predicted_total = 0
+        started = time.perf_counter()
+        for content, gold in samples:
+            predicted = entity_counts(predict_pairs(forward, content, mode))
+            true_positive += sum((predicted & gold).values())
+            predicted_total += sum(predicted.values())
+        seconds = time.perf_counter() - started
+
+        report[name] = prf(true_positive, predicted_total, gold_total)
+        report[name]["ms_per_cv"] = round(seconds * 1000 / max(len(samples), 1), 2)
+        report[name]["parameters"] = sum(p.numel() for p in model.parameters())
+    report["documents"] = len(samples)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill the NER model into a smaller student")
+    parser.add_argument("--data", default=os.path.join("ner_resumes", "*.json"))
+    parser.add_argument("--unlabeled", default=os.path.join("data", "r*.txt"))
+    parser.add_argument("--max-unlabeled", type=int, default=0, help="Số file không nhãn tối đa, 0 = tất cả")
+    parser.add_argument("--output", default=os.path.join("models", "student"))
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.5, help="Trọng số của loss trên nhãn gốc")
+    parser.add_argument("--eval-fraction", type=float, default=0.2)
+    parser.add_argument("--mode", default="window", choices=server.NER_MODES)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    torch.manual_seed(args.seed)
+
+    files = sorted(glob.glob(args.data))
+    rng.shuffle(files)
+    eval_count = int(len(files) * args.eval_fraction)
+    eval_files, train_files = files[:eval_count], files[eval_count:]
+
+    labeled = labeled_sequences(train_files, server.tokenizer, server.tag2idx, server.MAX_LEN, sentences=True)
+    unlabeled_paths = sorted(glob.glob(args.unlabeled))
+    if args.max_unlabeled:
+        unlabeled_paths = unlabeled_paths[: args.max_unlabeled]
+    texts = []
+    for path in unlabeled_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    unlabeled = [
+        window_tokens
+        for _, windows in server.prepare_windows_batch(texts, "segment")
+        for _, window_tokens in windows
+    ]
+    print(f"Labeled sentences: {len(labeled)} ({len(train_files)} files), unlabeled segments: {len(unlabeled)}")
+
+    teacher = server.bert_model
+    started = time.perf_counter()
+    soft_labels = teacher_logits(
+        teacher, [tokens for tokens, _ in labeled] + unlabeled, args.batch_size
+    )
+    print(f"Teacher soft labels computed in {time.perf_counter() - started:.1f}s")
+    examples = [(tokens, tag_ids, soft_labels[i]) for i, (tokens, tag_ids) in enumerate(labeled)]
+    examples += [(tokens, None, soft_labels[len(labeled) + i]) for i, tokens in enumerate(unlabeled)]
+
+    student, student_config = build_student(teacher, args.layers)
+    history = train(student, examples, args)
+
+    # Lưu theo cấu trúc của models/ để server.py load được với NER_MODEL_DIR=<output>
+    os.makedirs(args.output, exist_ok=True)
+    torch.save(student.state_dict(), os.path.join(args.output, "pytorch_model.bin"))
+    student_config.to_json_file(os.path.join(args.output, "config.json"))
+    shutil.copy(os.path.join(server.bert_out_address, "vocab.txt"), os.path.join(args.output, "vocab.txt"))
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "teacher_dir": server.bert_out_address,
+        "student_dir": args.output,
+        "student_layers": args.layers,
+        "eval_files": len(eval_files),
+        "mode": args.mode,
+        "training": {
+            "labeled_sentences": len(labeled),
+            "unlabeled_segments": len(unlabeled),
+            "epochs": history,
+            "temperature": args.temperature,
+            "alpha": args.alpha,
+            "lr": args.lr,
+            "batch_size": args.batch_size,
+            "seed": args.seed,
+        },
+    }
+    if eval_files:
+        report.update(evaluate({"teacher": teacher, "student": student}, eval_files, args.mode))
+        report["f1_drop"] = round(report["teacher"]["f1"] - report["student"]["f1"], 4)
+        report["speedup"] = round(report["teacher"]["ms_per_cv"] / max(report["student"]["ms_per_cv"], 1e-9), 2)
+
+    with open(os.path.join(args.output, "distillation_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Saved student to {args.output}")
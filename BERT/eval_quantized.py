@@ -0,0 +1,131 @@
+"""Đánh giá model int8 (dynamic quantization) so với model full-precision trên ner_resumes/*.json.
+
+Đo tỉ lệ tag trùng khớp giữa hai model và entity-level F1 của từng model so với nhãn gốc,
+rồi lưu report mà server.py kiểm tra trước khi chạy với NER_BACKEND=quantized.
+
+Usage:
+    python eval_quantized.py [--data "ner_resumes/*.json"] [--output models/quantization_report.json]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+# Model tham chiếu là checkpoint full-precision
+os.environ["NER_BACKEND"] = "torch"
+
+import server
+
+
+def normalize_entity(text: str) -> str:
+    """Bỏ khoảng trắng vì token được nối lại không có dấu cách."""
+    return "".join(text.split())
+
+
+def load_annotations(data_glob: str) -> list:
+    """Đọc (text, entities) từ các file annotation định dạng spaCy."""
+    samples = []
+    for path in sorted(glob.glob(data_glob)):
+        with open(path, "r", encoding="utf-8") as f:
+            json_data = json.load(f)
+        for content, entities_dict in json_data.get("annotations", []):
+            gold = Counter(
+                (label.strip(), normalize_entity(content[start:end]))
+                for start, end, label in entities_dict.get("entities", [])
+            )
+            samples.append((content, gold))
+    return samples
+
+
+def predict_pairs(forward, cv_data: str, mode: str) -> list:
+    content_tokens, windows = server.prepare_windows(cv_data, mode)
+    predictions = server.predict_token_batch(
+        [window_tokens for _, window_tokens in windows], forward=forward
+    )
+    return server.build_token_tag_pairs(
+        *server.merge_window_predictions(content_tokens, windows, predictions)
+    )
+
+
+def entity_counts(token_tag_pairs: list) -> Counter:
+    return Counter(
+        (tag, normalize_entity(text)) for text, tag, _, _ in server.entity_decoder.decode_token_list(token_tag_pairs)
+    )
+
+
+def prf(true_positive: int, predicted: int, gold: int) -> dict:
+    precision = true_positive / predicted if predicted else 0.0
+    recall = true_positive / gold if gold else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def evaluate(data_glob: str, mode: str) -> dict:
+    fp_model = server.bert_model
+    int8_model = server.quantize_model(fp_model)
+
+    models = {
+        "fp32": lambda ids, masks: server.torch_forward(fp_model, ids, masks),
+        "int8": lambda ids, masks: server.torch_forward(int8_model, ids, masks),
+    }
+
+    samples = load_annotations(data_glob)
+    stats = {name: {"tp": 0, "predicted": 0, "seconds": 0.0} for name in models}
+    gold_total = 0
+    total_tokens = 0
+    agreed_tokens = 0
+
+    for content, gold in samples:
+        gold_total += sum(gold.values())
+        pairs = {}
+        for name, forward in models.items():
+            started = time.perf_counter()
+            pairs[name] = predict_pairs(forward, content, mode)
+            stats[name]["seconds"] += time.perf_counter() - started
+
+            predicted = entity_counts(pairs[name])
+            stats[name]["tp"] += sum((predicted & gold).values())
+            stats[name]["predicted"] += sum(predicted.values())
+
+        total_tokens += len(pairs["fp32"])
+        agreed_tokens += sum(a["tag"] == b["tag"] for a, b in zip(pairs["fp32"], pairs["int8"]))
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "data": data_glob,
+        "mode": mode,
+        # server.py chỉ chấp nhận report đo trên đúng checkpoint đang load và NER_DEFAULT_MODE
+        "weights_fingerprint": server.weights_fingerprint(server.loaded_weights_path()),
+        "documents": len(samples),
+        "tokens": total_tokens,
+        "tag_agreement": round(agreed_tokens / max(total_tokens, 1), 6),
+    }
+    for name in models:
+        report[name] = prf(stats[name]["tp"], stats[name]["predicted"], gold_total)
+        report[name]["ms_per_cv"] = round(stats[name]["seconds"] * 1000 / max(len(samples), 1), 2)
+    report["f1_drop"] = round(report["fp32"]["f1"] - report["int8"]["f1"], 4)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate int8 NER model against full precision")
+    parser.add_argument("--data", default=os.path.join("ner_resumes", "*.json"))
+    parser.add_argument("--output", default=server.QUANT_REPORT_PATH)
+    parser.add_argument("--mode", default=server.DEFAULT_MODE, choices=server.NER_MODES, help="Mặc định NER_DEFAULT_MODE")
+    parser.add_argument("--max-f1-drop", type=float, default=server.QUANT_MAX_F1_DROP)
+    args = parser.parse_args()
+
+    report = evaluate(args.data, args.mode)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print(f"Saved report to {args.output}")
+
+    if report["f1_drop"] > args.max_f1_drop:
+        print(f"FAILED: F1 drop {report['f1_drop']} exceeds {args.max_f1_drop}")
+        sys.exit(1)
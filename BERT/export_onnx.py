@@ -0,0 +1,60 @@
+"""Export BertForTokenClassification trong models/ sang ONNX (một lần) cho NER_BACKEND=onnx.
+
+Usage:
+    python export_onnx.py [--output models/ner_model.onnx] [--opset 14]
+"""
+import argparse
+import os
+
+# Export luôn đọc checkpoint PyTorch gốc
+os.environ["NER_BACKEND"] = "torch"
+
+import torch
+
+import server
+
+
+class LogitsWrapper(torch.nn.Module):
+    """Bọc model để ONNX graph chỉ nhận input_ids và attention_mask."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids, token_type_ids=None, attention_mask=attention_mask)
+
+
+def export(output_path: str, opset: int):
+    wrapper = LogitsWrapper(server.bert_model).eval()
+
+    # Input mẫu; batch và sequence length là dynamic axes
+    sample_ids = torch.tensor(
+        [server.tokens_to_ids(["[CLS]", "Software", "Engineer", "[SEP]"])], dtype=torch.long
+    )
+    sample_mask = torch.ones_like(sample_ids)
+
+    torch.onnx.export(
+        wrapper,
+        (sample_ids, sample_mask),
+        output_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch", 1: "sequence"},
+        },
+        opset_version=opset,
+        do_constant_folding=True,
+        dynamo=False,
+    )
+    print(f"Exported ONNX model to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export NER model to ONNX")
+    parser.add_argument("--output", default=server.ONNX_MODEL_PATH)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+    export(args.output, args.opset)
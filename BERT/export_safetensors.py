@@ -0,0 +1,30 @@
+"""Tạo snapshot safetensors của models/pytorch_model.bin để server.py memory-map khi khởi động.
+
+Usage:
+    python export_safetensors.py [--output models/model.safetensors]
+"""
+import argparse
+import os
+
+# Snapshot luôn được tạo từ checkpoint PyTorch gốc
+os.environ["NER_BACKEND"] = "torch"
+os.environ["NER_WEIGHTS_SNAPSHOT"] = ""
+
+from safetensors.torch import save_file
+
+import server
+
+
+def export(output_path: str):
+    state_dict = {
+        name: tensor.contiguous() for name, tensor in server.bert_model.state_dict().items()
+    }
+    save_file(state_dict, output_path, metadata={"num_labels": str(len(server.tag2idx))})
+    print(f"Saved {len(state_dict)} tensors to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export NER weights to safetensors")
+    parser.add_argument("--output", default=os.path.join(server.bert_out_address, "model.safetensors"))
+    args = parser.parse_args()
+    export(args.output)
@@ -0,0 +1,48 @@
+"""Cấu hình gunicorn cho server.py, cùng cách chạy với serve(): model load một lần ở master
+(preload_app), các worker fork ra dùng chung bộ nhớ (copy-on-write) và chia CPU theo NER_WORKERS.
+
+Usage:
+    PROMETHEUS_MULTIPROC_DIR=/tmp/ner-metrics gunicorn -c gunicorn_conf.py server:app
+
+Các biến NER_HOST, NER_PORT, NER_WORKERS, NER_HTTP_THREADS giống khi chạy python server.py.
+"""
+import gc
+import os
+
+bind = f"{os.getenv('NER_HOST', '0.0.0.0')}:{os.getenv('NER_PORT', '6969')}"
+workers = int(os.getenv("NER_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("NER_HTTP_THREADS", "8"))
+preload_app = True
+# Warmup và CV dài có thể chạy lâu hơn mặc định 30 giây
+timeout = int(os.getenv("NER_WORKER_TIMEOUT", "120"))
+
+
+def on_starting(arbiter):
+    """Xoá số liệu Prometheus của lần chạy trước."""
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def when_ready(arbiter):
+    # Object đã load không còn bị GC quét nữa, tránh copy các trang bộ nhớ dùng chung sau fork
+    gc.freeze()
+
+
+def post_fork(arbiter, worker):
+    """Trong worker ngay sau fork: chia thread của torch/onnxruntime và bắt đầu warmup."""
+    import server
+
+    server.configure_worker_threads(forked=True)
+    server.start_warmup()
+
+
+def child_exit(arbiter, worker):
+    import server
+
+    if server.prometheus_client is not None and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        server.prometheus_multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,113 @@
+"""Dựng chuỗi wordpiece có nhãn BILUO từ các file annotation ner_resumes/*.json (định dạng spaCy).
+
+Cách gán nhãn giống get_train_data / get_tokenized_train_data trong BERT.ipynb: tag BILUO theo từ,
+wordpiece đầu của mỗi từ mang tag của từ, các wordpiece sau là "X", chuỗi được bọc [CLS] ... [SEP].
+Từ được tách bằng tokenizer của spaCy (spacy.blank("en"), cùng luật tách từ với en_core_web_lg lúc
+train) nếu đã cài spacy; nếu không thì bằng WORD_RE, gần đúng với spaCy: email, URL, số có dấu phân
+cách ("3.5", "3.5/4.0") và từ có dấu chấm ("Node.js", "B.Sc") là một từ, còn lại là chữ/số liền nhau
+hoặc từng dấu câu.
+"""
+import json
+import re
+
+try:
+    import spacy
+except ImportError:
+    spacy = None
+
+WORD_RE = re.compile(
+    r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+    r"|(?:https?://)?(?:www\.)?[\w-]+(?:\.[\w-]+)*\.(?:com|org|net|io|vn)(?:/[\w./-]*[\w/])?"
+    r"|\d+(?:[.,/]\d+)+"
+    r"|\w+(?:\.\w+)+"
+    r"|\w+|[^\w\s]"
+)
+_spacy_tokenizer = None
+# Tăng khi đổi cách dựng nhãn; artifact học từ nhãn cũ (exit heads) phải train lại.
+# 2: giữ tag B-/I-/L-/U- có trong tag2idx theo vị trí của từ, tách từ như spaCy (email, "3.5/4.0" là một từ)
+LABELS_VERSION = 2
+
+
+def split_words(content: str) -> list:
+    """List (từ, start, end) theo ký tự trong content."""
+    global _spacy_tokenizer
+    if spacy is None:
+        return [(match.group(), match.start(), match.end()) for match in WORD_RE.finditer(content)]
+    if _spacy_tokenizer is None:
+        _spacy_tokenizer = spacy.blank("en").tokenizer
+    return [
+        (token.text, token.idx, token.idx + len(token.text))
+        for token in _spacy_tokenizer(content)
+        if not token.is_space
+    ]
+
+
+def load_annotation_file(path: str) -> list:
+    """List (content, entities) của một file annotation, entities là [(start, end, label)]."""
+    with open(path, "r", encoding="utf-8") as f:
+        json_data = json.load(f)
+    return [
+        (content, entities_dict.get("entities", []))
+        for content, entities_dict in json_data.get("annotations", [])
+    ]
+
+
+def word_biluo_tags(content: str, entities: list, tag2idx: dict) -> list:
+    """Gán tag BILUO cho từng từ, trả về list (từ, tag).
+
+    Chỉ cần tag đúng vị trí của từ có trong tag2idx (U- cho entity một từ, B-/I-/L- cho entity nhiều từ;
+    ví dụ NAME không có U-NAME, EMAIL chỉ có U-EMAIL), nếu không từ đó là "O".
+    """
+    words = split_words(content)
+    labels = [None] * len(words)
+    for entity_index, (start, end, label) in enumerate(entities):
+        for i, (_, word_start, word_end) in enumerate(words):
+            if word_start < end and word_end > start and labels[i] is None:
+                labels[i] = (entity_index, label.strip())
+
+    tagged = []
+    prefixes = {(False, False): "U", (False, True): "B", (True, True): "I", (True, False): "L"}
+    for i, (word, _, _) in enumerate(words):
+        if labels[i] is None:
+            tagged.append((word, "O"))
+            continue
+        has_prev = i > 0 and labels[i - 1] == labels[i]
+        has_next = i + 1 < len(words) and labels[i + 1] == labels[i]
+        tag = f"{prefixes[(has_prev, has_next)]}-{labels[i][1]}"
+        tagged.append((word, tag if tag in tag2idx else "O"))
+    return tagged
+
+
+def split_sentences(tagged_words: list) -> list:
+    """Chia tại mỗi từ "." có tag O ("." mở đầu câu sau) và bỏ câu chỉ toàn "O", như get_train_data."""
+    sentences = []
+    current = []
+    for word, tag in tagged_words:
+        if word == "." and tag == "O" and current:
+            sentences.append(current)
+            current = []
+        current.append((word, tag))
+    if current:
+        sentences.append(current)
+    return [sentence for sentence in sentences if any(tag != "O" for _, tag in sentence)]
+
+
+def labeled_sequences(paths: list, tokenizer, tag2idx: dict, max_len: int, sentences: bool = False) -> list:
+    """Chuỗi (tokens, tag_ids) dạng input của model: [CLS] + wordpiece + [SEP], dài tối đa max_len.
+
+    sentences=True chia mỗi CV thành các câu giống dữ liệu train, ngược lại mỗi CV là một chuỗi.
+    """
+    sequences = []
+    for path in paths:
+        for content, entities in load_annotation_file(path):
+            tagged_words = word_biluo_tags(content, entities, tag2idx)
+            for part in split_sentences(tagged_words) if sentences else [tagged_words]:
+                tokens, tags = ["[CLS]"], ["[CLS]"]
+                for word, tag in part:
+                    pieces = tokenizer.tokenize(word) or ["[UNK]"]
+                    tokens.extend(pieces)
+                    tags.extend([tag] + ["X"] * (len(pieces) - 1))
+                tokens = tokens[: max_len - 1] + ["[SEP]"]
+                tags = tags[: max_len - 1] + ["[SEP]"]
+                sequences.append((tokens, [tag2idx[tag] for tag in tags]))
+    return sequences
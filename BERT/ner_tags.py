@@ -0,0 +1,120 @@
+"""Bảng tag BILUO của model NER (cùng thứ tự id với lúc train trong BERT.ipynb).
+
+Tách khỏi server.py để các tool (ví dụ check_biluo_decoder.py) dùng được mà không phải load model.
+"""
+tag2idx = {
+    "U-DESIG": 0,
+    "U-PHONE": 1,
+    "I-CERTIFICATION": 2,
+    "O": 3,
+    "I-UNI": 4,
+    "U-GITHUB": 5,
+    "I-PROJECT_DESCRIPTION": 6,
+    "B-GRADUATION_YEAR": 7,
+    "I-GRADUATION_YEAR": 8,
+    "L-GITHUB": 9,
+    "I-LOC": 10,
+    "B-WORKING_DESCRIPTION": 11,
+    "L-LOC": 12,
+    "I-WORKING_COMPANY_EXPERIENCES": 13,
+    "B-CERTIFICATION": 14,
+    "I-NAME": 15,
+    "[SEP]": 16,
+    "U-WORKING_COMPANY_EXPERIENCES": 17,
+    "L-UNI": 18,
+    "B-WORKING_TIME_EXPERIENCES": 19,
+    "L-PROJECT": 20,
+    "B-PROJECT": 21,
+    "B-NAME": 22,
+    "I-WORKING_DESCRIPTION": 23,
+    "L-TECHSTACK_SKILLS": 24,
+    "U-TECHSTACK_SKILLS": 25,
+    "B-DEG": 26,
+    "U-LOC": 27,
+    "L-WORKING_TIME_EXPERIENCES": 28,
+    "L-CERTIFICATION": 29,
+    "L-DEG": 30,
+    "L-GRADUATION_YEAR": 31,
+    "B-TECHSTACK_SKILLS": 32,
+    "L-DESIG": 33,
+    "L-WORKING_DESCRIPTION": 34,
+    "I-DEG": 35,
+    "I-PROJECT": 36,
+    "U-EMAIL": 37,
+    "I-TECHSTACK_SKILLS": 38,
+    "L-PROJECT_DESCRIPTION": 39,
+    "B-GITHUB": 40,
+    "B-UNI": 41,
+    "[CLS]": 42,
+    "I-DESIG": 43,
+    "B-DESIG": 44,
+    "I-WORKING_TIME_EXPERIENCES": 45,
+    "B-LOC": 46,
+    "L-NAME": 47,
+    "B-PROJECT_DESCRIPTION": 48,
+    "B-WORKING_COMPANY_EXPERIENCES": 49,
+    "L-WORKING_COMPANY_EXPERIENCES": 50,
+    "U-GPA": 51,
+    "U-CERTIFICATION": 52,
+    "X": 53,
+}
+
+idx2tag = {
+    0: "U-DESIG",
+    1: "U-PHONE",
+    2: "I-CERTIFICATION",
+    3: "O",
+    4: "I-UNI",
+    5: "U-GITHUB",
+    6: "I-PROJECT_DESCRIPTION",
+    7: "B-GRADUATION_YEAR",
+    8: "I-GRADUATION_YEAR",
+    9: "L-GITHUB",
+    10: "I-LOC",
+    11: "B-WORKING_DESCRIPTION",
+    12: "L-LOC",
+    13: "I-WORKING_COMPANY_EXPERIENCES",
+    14: "B-CERTIFICATION",
+    15: "I-NAME",
+    16: "[SEP]",
+    17: "U-WORKING_COMPANY_EXPERIENCES",
+    18: "L-UNI",
+    19: "B-WORKING_TIME_EXPERIENCES",
+    20: "L-PROJECT",
+    21: "B-PROJECT",
+    22: "B-NAME",
+    23: "I-WORKING_DESCRIPTION",
+    24: "L-TECHSTACK_SKILLS",
+    25: "U-TECHSTACK_SKILLS",
+    26: "B-DEG",
+    27: "U-LOC",
+    28: "L-WORKING_TIME_EXPERIENCES",
+    29: "L-CERTIFICATION",
+    30: "L-DEG",
+    31: "L-GRADUATION_YEAR",
+    32: "B-TECHSTACK_SKILLS",
+    33: "L-DESIG",
+    34: "L-WORKING_DESCRIPTION",
+    35: "I-DEG",
+    36: "I-PROJECT",
+    37: "U-EMAIL",
+    38: "I-TECHSTACK_SKILLS",
+    39: "L-PROJECT_DESCRIPTION",
+    40: "B-GITHUB",
+    41: "B-UNI",
+    42: "[CLS]",
+    43: "I-DESIG",
+    44: "B-DESIG",
+    45: "I-WORKING_TIME_EXPERIENCES",
+    46: "B-LOC",
+    47: "L-NAME",
+    48: "B-PROJECT_DESCRIPTION",
+    49: "B-WORKING_COMPANY_EXPERIENCES",
+    50: "L-WORKING_COMPANY_EXPERIENCES",
+    51: "U-GPA",
+    52: "U-CERTIFICATION",
+    53: "X",
+}
+
+# Bảng id -> tag dạng list, gửi kèm response columnar
+IDX2TAG_LIST = [idx2tag[i] for i in range(len(idx2tag))]
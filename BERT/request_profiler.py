@@ -0,0 +1,173 @@
+"""Profiling theo từng request cho các Flask server (server.py, cv_scoring_server.py).
+
+Bật cho một request bằng header X-Profile (hoặc query ?profile=) với giá trị "cprofile" hoặc
+"torch", kèm admin token trong header X-Profile-Token (hoặc ?profile_token=). Mặc định profile
+được trả về dạng file đính kèm thay cho response; X-Profile-Output: store (hoặc
+?profile_output=store) lưu profile vào thư mục profile và trả response bình thường kèm
+header X-Profile-Path.
+
+- "cprofile": file .prof (pstats) của thread xử lý request.
+- "torch": chrome trace .json của torch.profiler (op của thread xử lý request).
+
+Cả hai chỉ thấy thread đã bật profiler, nên server.py chạy forward của request đang được profile
+ngay trên thread xử lý request thay vì qua inference scheduler (xem active_profile_kind); thời gian
+chờ trong hàng đợi của scheduler không có trong profile.
+
+sample_rate > 0 bật profiling lấy mẫu luôn chạy: mỗi request có xác suất sample_rate được
+profile bằng cProfile và lưu vào thư mục profile, không cần token. Thư mục profile chỉ giữ
+max_files file mới nhất, file cũ hơn bị xoá mỗi khi lưu profile mới.
+"""
+import cProfile
+import hmac
+import marshal
+import os
+import random
+import tempfile
+import threading
+from datetime import datetime
+
+from flask import Response, g, has_request_context, jsonify, request
+
+PROFILERS = ("cprofile", "torch")
+PROFILE_OUTPUTS = ("attachment", "store")
+
+# torch.profiler chỉ cho phép một phiên profile trong mỗi process
+_torch_profile_lock = threading.Lock()
+
+
+def active_profile_kind():
+    """Loại profiler đang chạy cho request hiện tại, None nếu request không được profile."""
+    if not has_request_context() or "request_profile" not in g:
+        return None
+    return g.request_profile[0]
+
+
+def start_profiler(kind: str):
+    """Bắt đầu profile; trả về None nếu đã có profiler khác đang chạy."""
+    if kind == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: chỉ một profiler được bật tại một thời điểm
+            return None
+        return profiler
+
+    if not _torch_profile_lock.acquire(blocking=False):
+        return None
+    import torch
+
+    profiler = torch.profiler.profile(
+        activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True
+    )
+    profiler.start()
+    return profiler
+
+
+def stop_profiler(kind: str, profiler) -> tuple:
+    """Dừng profile, trả về (nội dung file, phần mở rộng)."""
+    if kind == "cprofile":
+        profiler.disable()
+        profiler.create_stats()
+        # Cùng định dạng với Profile.dump_stats, đọc được bằng pstats/snakeviz
+        return marshal.dumps(profiler.stats), "prof"
+
+    try:
+        profiler.stop()
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            path = f.name
+        try:
+            profiler.export_chrome_trace(path)
+            with open(path, "rb") as f:
+                return f.read(), "json"
+        finally:
+            os.remove(path)
+    finally:
+        _torch_profile_lock.release()
+
+
+def prune_profiles(profile_dir: str, max_files: int):
+    """Xoá các file profile cũ nhất (tên bắt đầu bằng thời điểm lưu) để thư mục còn tối đa max_files file."""
+    names = sorted(name for name in os.listdir(profile_dir) if name.endswith((".prof", ".json")))
+    for name in names[: max(0, len(names) - max_files)]:
+        try:
+            os.remove(os.path.join(profile_dir, name))
+        except FileNotFoundError:
+            pass  # Worker khác vừa xoá
+
+
+def install_request_profiler(
+    app,
+    admin_token: str = "",
+    profile_dir: str = "profiles",
+    sample_rate: float = 0.0,
+    log=print,
+    max_files: int = 100,
+):
+    """Gắn hook profiling vào app. admin_token rỗng thì chỉ còn profiling lấy mẫu."""
+    if not 0 <= sample_rate <= 1:
+        raise ValueError("Profile sample rate must be in 0..1")
+    if max_files < 1:
+        raise ValueError("Profile max files must be >= 1")
+    # Không dùng random toàn cục vì các server seed nó để kết quả deterministic
+    sampler = random.Random()
+
+    @app.before_request
+    def start_request_profile():
+        requested = request.headers.get("X-Profile") or request.args.get("profile")
+        if requested:
+            kind = "cprofile" if requested.lower() in ("1", "true", "yes") else requested.lower()
+            if kind not in PROFILERS:
+                return jsonify({"error": f"profile must be one of {PROFILERS}"}), 400
+            output = request.headers.get("X-Profile-Output") or request.args.get("profile_output", "attachment")
+            if output not in PROFILE_OUTPUTS:
+                return jsonify({"error": f"profile_output must be one of {PROFILE_OUTPUTS}"}), 400
+            token = request.headers.get("X-Profile-Token") or request.args.get("profile_token", "")
+            if not admin_token or not hmac.compare_digest(token.encode("utf-8"), admin_token.encode("utf-8")):
+                return jsonify({"error": "Profiling requires a valid admin token"}), 403
+        elif sample_rate and sampler.random() < sample_rate:
+            kind, output = "cprofile", "store"
+        else:
+            return None
+
+        profiler = start_profiler(kind)
+        if profiler is None:
+            if requested:
+                return jsonify({"error": "Another profile is already running, try again"}), 409
+            return None
+        g.request_profile = (kind, output, profiler)
+        return None
+
+    @app.after_request
+    def finish_request_profile(response: Response) -> Response:
+        if "request_profile" not in g:
+            return response
+        kind, output, profiler = g.pop("request_profile")
+        data, extension = stop_profiler(kind, profiler)
+        filename = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.endpoint or 'unknown'}-{os.getpid()}.{extension}"
+
+        if output == "store":
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, filename)
+            with open(path, "wb") as f:
+                f.write(data)
+            prune_profiles(profile_dir, max_files)
+            log(f"Saved {kind} profile of {request.path} to {path}")
+            response.headers["X-Profile-Path"] = path
+            return response
+
+        return Response(
+            data,
+            mimetype="application/octet-stream",
+            headers={
+                "Content-Disposition": f'attachment; filename="{filename}"',
+                "X-Profiled-Status": str(response.status_code),
+            },
+        )
+
+    @app.teardown_request
+    def discard_request_profile(exc):
+        # View lỗi không qua after_request: vẫn phải tắt profiler và nhả lock của torch.profiler
+        if "request_profile" in g:
+            kind, _, profiler = g.pop("request_profile")
+            stop_profiler(kind, profiler)
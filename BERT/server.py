@@ -1,15 +1,51 @@
+import time
+
+_import_started = time.perf_counter()
+
 import torch
 import numpy as np
-from scipy.special import softmax
 import re
 from datetime import datetime
+import gc
+import gzip
 import hashlib
+import json
 import random
 import os
-from functools import lru_cache
-from flask import Flask, request, jsonify
-from pytorch_pretrained_bert import BertForTokenClassification, BertTokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from flask import Flask, Response, g, has_request_context, request, jsonify
+from pytorch_pretrained_bert import BertConfig, BertForTokenClassification, BertTokenizer
+from concatenate_tokens import BiluoDecoder
+from ner_tags import IDX2TAG_LIST, idx2tag, tag2idx
+from request_profiler import active_profile_kind, install_request_profiler
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Prometheus metrics (tuỳ chọn). Khi chạy nhiều worker, đặt PROMETHEUS_MULTIPROC_DIR
+# để /metrics tổng hợp số liệu của mọi worker
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess as prometheus_multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Thời gian khởi động từng giai đoạn (import, load weights, load tokenizer)
+STARTUP_TIMINGS = {"import_s": round(time.perf_counter() - _import_started, 3)}
 
 # ========== DETERMINISTIC SETUP ==========
 def set_deterministic_behavior():
@@ -29,287 +65,1595 @@ def set_deterministic_behavior():
 set_deterministic_behavior()
 
 # ========== TAG DEFINITIONS ==========
-tag2idx = {
-    "U-DESIG": 0,
-    "U-PHONE": 1,
-    "I-CERTIFICATION": 2,
-    "O": 3,
-    "I-UNI": 4,
-    "U-GITHUB": 5,
-    "I-PROJECT_DESCRIPTION": 6,
-    "B-GRADUATION_YEAR": 7,
-    "I-GRADUATION_YEAR": 8,
-    "L-GITHUB": 9,
-    "I-LOC": 10,
-    "B-WORKING_DESCRIPTION": 11,
-    "L-LOC": 12,
-    "I-WORKING_COMPANY_EXPERIENCES": 13,
-    "B-CERTIFICATION": 14,
-    "I-NAME": 15,
-    "[SEP]": 16,
-    "U-WORKING_COMPANY_EXPERIENCES": 17,
-    "L-UNI": 18,
-    "B-WORKING_TIME_EXPERIENCES": 19,
-    "L-PROJECT": 20,
-    "B-PROJECT": 21,
-    "B-NAME": 22,
-    "I-WORKING_DESCRIPTION": 23,
-    "L-TECHSTACK_SKILLS": 24,
-    "U-TECHSTACK_SKILLS": 25,
-    "B-DEG": 26,
-    "U-LOC": 27,
-    "L-WORKING_TIME_EXPERIENCES": 28,
-    "L-CERTIFICATION": 29,
-    "L-DEG": 30,
-    "L-GRADUATION_YEAR": 31,
-    "B-TECHSTACK_SKILLS": 32,
-    "L-DESIG": 33,
-    "L-WORKING_DESCRIPTION": 34,
-    "I-DEG": 35,
-    "I-PROJECT": 36,
-    "U-EMAIL": 37,
-    "I-TECHSTACK_SKILLS": 38,
-    "L-PROJECT_DESCRIPTION": 39,
-    "B-GITHUB": 40,
-    "B-UNI": 41,
-    "[CLS]": 42,
-    "I-DESIG": 43,
-    "B-DESIG": 44,
-    "I-WORKING_TIME_EXPERIENCES": 45,
-    "B-LOC": 46,
-    "L-NAME": 47,
-    "B-PROJECT_DESCRIPTION": 48,
-    "B-WORKING_COMPANY_EXPERIENCES": 49,
-    "L-WORKING_COMPANY_EXPERIENCES": 50,
-    "U-GPA": 51,
-    "U-CERTIFICATION": 52,
-    "X": 53,
-}
-
-idx2tag = {
-    0: "U-DESIG",
-    1: "U-PHONE",
-    2: "I-CERTIFICATION",
-    3: "O",
-    4: "I-UNI",
-    5: "U-GITHUB",
-    6: "I-PROJECT_DESCRIPTION",
-    7: "B-GRADUATION_YEAR",
-    8: "I-GRADUATION_YEAR",
-    9: "L-GITHUB",
-    10: "I-LOC",
-    11: "B-WORKING_DESCRIPTION",
-    12: "L-LOC",
-    13: "I-WORKING_COMPANY_EXPERIENCES",
-    14: "B-CERTIFICATION",
-    15: "I-NAME",
-    16: "[SEP]",
-    17: "U-WORKING_COMPANY_EXPERIENCES",
-    18: "L-UNI",
-    19: "B-WORKING_TIME_EXPERIENCES",
-    20: "L-PROJECT",
-    21: "B-PROJECT",
-    22: "B-NAME",
-    23: "I-WORKING_DESCRIPTION",
-    24: "L-TECHSTACK_SKILLS",
-    25: "U-TECHSTACK_SKILLS",
-    26: "B-DEG",
-    27: "U-LOC",
-    28: "L-WORKING_TIME_EXPERIENCES",
-    29: "L-CERTIFICATION",
-    30: "L-DEG",
-    31: "L-GRADUATION_YEAR",
-    32: "B-TECHSTACK_SKILLS",
-    33: "L-DESIG",
-    34: "L-WORKING_DESCRIPTION",
-    35: "I-DEG",
-    36: "I-PROJECT",
-    37: "U-EMAIL",
-    38: "I-TECHSTACK_SKILLS",
-    39: "L-PROJECT_DESCRIPTION",
-    40: "B-GITHUB",
-    41: "B-UNI",
-    42: "[CLS]",
-    43: "I-DESIG",
-    44: "B-DESIG",
-    45: "I-WORKING_TIME_EXPERIENCES",
-    46: "B-LOC",
-    47: "L-NAME",
-    48: "B-PROJECT_DESCRIPTION",
-    49: "B-WORKING_COMPANY_EXPERIENCES",
-    50: "L-WORKING_COMPANY_EXPERIENCES",
-    51: "U-GPA",
-    52: "U-CERTIFICATION",
-    53: "X",
-}
+# tag2idx, idx2tag, IDX2TAG_LIST nằm trong ner_tags.py để dùng được mà không cần load model
+entity_decoder = BiluoDecoder(idx2tag)
 
 # ========== MODEL SETUP ==========
+# Thư mục model (config.json, vocab.txt, weights); NER_MODEL_DIR trỏ tới model khác, ví dụ student của distill.py
+bert_out_address = os.getenv("NER_MODEL_DIR", "models")
+
+def load_runtime_profile(path: str, backend: str) -> dict:
+    """Đọc cấu hình tốt nhất do autotune.py đo cho backend đang chạy; {} nếu chưa có hoặc không khớp."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        profile = json.load(f)
+    if profile.get("backend") != backend:
+        print(f"Runtime profile {path} was tuned for {profile.get('backend')}, ignoring it")
+        return {}
+    if profile.get("cpu_count") != os.cpu_count():
+        print(f"Runtime profile {path} was tuned on {profile.get('cpu_count')} CPUs, this machine has {os.cpu_count()}")
+    print(f"Loaded runtime profile {path}: {profile['settings']}")
+    return profile["settings"]
+
+# Profile do autotune.py tạo ra (mặc định trong thư mục model, mỗi model một profile) cung cấp giá trị
+# mặc định cho batch size và số thread, biến môi trường vẫn được ưu tiên; NER_RUNTIME_PROFILE="" để bỏ qua profile
+RUNTIME_PROFILE_PATH = os.getenv("NER_RUNTIME_PROFILE", os.path.join(bert_out_address, "runtime_profile.json"))
+RUNTIME_PROFILE = load_runtime_profile(RUNTIME_PROFILE_PATH, os.getenv("NER_BACKEND", "torch"))
+
 MAX_LEN = 512
-bert_out_address = "models"
+# Số CV tối đa trong một forward pass và số CV tối đa trong một request batch
+BATCH_SIZE = int(os.getenv("NER_BATCH_SIZE", RUNTIME_PROFILE.get("batch_size", 8)))
+MAX_BATCH_CVS = int(os.getenv("NER_MAX_BATCH_CVS", "256"))
+# Định dạng response: "tokens" (list object như cũ), "columnar" (các mảng song song)
+# hoặc "entities" (ghép BILUO thành entity ngay trên server)
+RESPONSE_FORMATS = ("tokens", "columnar", "entities")
+GZIP_LEVEL = int(os.getenv("NER_GZIP_LEVEL", "5"))
+# Cache kết quả trong bộ nhớ: giới hạn theo dung lượng ước lượng (MB), TTL tuỳ chọn (0 = không hết hạn)
+MEMORY_CACHE_MAX_MB = float(os.getenv("NER_CACHE_MAX_MB", "256"))
+MEMORY_CACHE_TTL_S = float(os.getenv("NER_CACHE_TTL_S", "0"))
+# Cache kết quả trên đĩa (SQLite) dùng chung giữa các worker và qua các lần restart; "" để tắt
+DISK_CACHE_PATH = os.getenv("NER_DISK_CACHE", os.path.join("cache", "ner_results.sqlite3"))
+# Sliding-window cho CV dài hơn MAX_LEN: mỗi cửa sổ chứa WINDOW_STRIDE + WINDOW_OVERLAP token nội dung,
+# hai cửa sổ liên tiếp chồng lên nhau WINDOW_OVERLAP token.
+# "segment" chia CV tại các từ "." đứng riêng (gần với câu của get_train_data lúc train), mỗi đoạn chạy như một câu riêng.
+# "incremental" chia CV thành các cửa sổ theo nội dung (INCREMENTAL_MIN_TOKENS..INCREMENTAL_MAX_TOKENS token,
+# cắt trước token "." hoặc token có hash rơi vào mốc) và cache dự đoán của từng cửa sổ theo nội dung:
+# CV gửi lại sau khi sửa một dòng chỉ chạy model cho cửa sổ chứa dòng đó
+NER_MODES = ("truncate", "window", "segment", "incremental")
+DEFAULT_MODE = os.getenv("NER_DEFAULT_MODE", "truncate")
+WINDOW_STRIDE = int(os.getenv("NER_WINDOW_STRIDE", "382"))
+WINDOW_OVERLAP = int(os.getenv("NER_WINDOW_OVERLAP", "128"))
+WINDOW_MAX_CHARS = int(os.getenv("NER_WINDOW_MAX_CHARS", "50000"))
+INCREMENTAL_MIN_TOKENS = int(os.getenv("NER_INCREMENTAL_MIN_TOKENS", "32"))
+INCREMENTAL_MAX_TOKENS = int(os.getenv("NER_INCREMENTAL_MAX_TOKENS", "128"))
+# Trung bình cứ 32 token có một token làm được ranh giới (ngoài token ".")
+INCREMENTAL_CUT_MODULUS = 32
+# Tăng khi đổi cách chia đoạn/cửa sổ của "segment" và "incremental" để cache kết quả cũ mất hiệu lực
+SPLIT_VERSION = 2
+# Micro-batching giữa các request: một worker duy nhất gom chuỗi token tới tối đa
+# SCHEDULER_MAX_BATCH chuỗi hoặc chờ tối đa SCHEDULER_MAX_WAIT_MS rồi chạy một forward pass
+SCHEDULER_ENABLED = os.getenv("NER_SCHEDULER", "1") == "1"
+SCHEDULER_MAX_BATCH = int(os.getenv("NER_SCHEDULER_MAX_BATCH", str(BATCH_SIZE)))
+SCHEDULER_MAX_WAIT_MS = float(os.getenv("NER_SCHEDULER_MAX_WAIT_MS", "10"))
+# Hai lane ưu tiên: "interactive" luôn được xếp vào batch trước "bulk". Lane chọn theo header X-Priority
+# (hoặc ?priority=), mặc định /resume_parsing/batch là bulk, còn lại interactive. Chống đói: khi chuỗi
+# bulk cũ nhất đã chờ quá SCHEDULER_BULK_MAX_WAIT_MS, SCHEDULER_BULK_SHARE phần mỗi batch dành cho bulk
+SCHEDULER_LANES = ("interactive", "bulk")
+SCHEDULER_BULK_MAX_WAIT_MS = float(os.getenv("NER_SCHEDULER_BULK_MAX_WAIT_MS", "1000"))
+SCHEDULER_BULK_SHARE = float(os.getenv("NER_SCHEDULER_BULK_SHARE", "0.25"))
+# Serving: NER_WORKERS process được fork từ process chính sau khi model đã load (copy-on-write),
+# mỗi worker dùng NER_TORCH_THREADS intra-op thread (0 = chia đều số CPU cho các worker).
+# Mỗi worker chạy waitress với NER_HTTP_THREADS thread xử lý request (nếu chưa cài waitress thì dùng
+# server dev của werkzeug, không dùng cho production). Production cũng có thể chạy bằng gunicorn:
+#   gunicorn -c gunicorn_conf.py server:app
+SERVER_HOST = os.getenv("NER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("NER_PORT", "6969"))
+SERVER_WORKERS = int(os.getenv("NER_WORKERS", "1"))
+SERVER_HTTP_THREADS = int(os.getenv("NER_HTTP_THREADS", "8"))
+TORCH_THREADS = int(os.getenv("NER_TORCH_THREADS", RUNTIME_PROFILE.get("intra_op_threads", 0)))
+TORCH_INTEROP_THREADS = int(
+    os.getenv("NER_TORCH_INTEROP_THREADS", RUNTIME_PROFILE.get("inter_op_threads", 1))
+)
+# Profiling theo request (request_profiler.py): bật bằng header X-Profile kèm NER_PROFILE_TOKEN,
+# hoặc lấy mẫu NER_PROFILE_SAMPLE_RATE phần request; profile lưu trong NER_PROFILE_DIR (giữ NER_PROFILE_MAX_FILES file mới nhất)
+PROFILE_TOKEN = os.getenv("NER_PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("NER_PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("NER_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_FILES = int(os.getenv("NER_PROFILE_MAX_FILES", "100"))
+# Warmup khi worker khởi động: chạy CV giả cắt ở các độ dài NER_WARMUP_LENGTHS (wordpiece, gồm [CLS]/[SEP])
+# qua model; /ready trả 503 cho tới khi xong
+WARMUP_ENABLED = os.getenv("NER_WARMUP", "1") == "1"
+WARMUP_LENGTHS = [int(item) for item in os.getenv("NER_WARMUP_LENGTHS", "32,128,512").split(",") if item.strip()]
+if SERVER_WORKERS < 1 or SERVER_HTTP_THREADS < 1 or TORCH_THREADS < 0 or TORCH_INTEROP_THREADS < 1:
+    raise ValueError("NER_WORKERS, NER_HTTP_THREADS and NER_TORCH_INTEROP_THREADS must be >= 1, NER_TORCH_THREADS >= 0")
+if not 0 < SCHEDULER_BULK_SHARE <= 1:
+    raise ValueError("NER_SCHEDULER_BULK_SHARE must be in (0, 1]")
+if any(not 3 <= length <= MAX_LEN for length in WARMUP_LENGTHS):
+    raise ValueError("NER_WARMUP_LENGTHS must be in 3..MAX_LEN")
+if DEFAULT_MODE not in NER_MODES:
+    raise ValueError(f"NER_DEFAULT_MODE must be one of {NER_MODES}")
+if WINDOW_STRIDE <= 0 or WINDOW_OVERLAP < 0 or WINDOW_STRIDE + WINDOW_OVERLAP > MAX_LEN - 2:
+    raise ValueError("NER_WINDOW_STRIDE + NER_WINDOW_OVERLAP must be in 1..MAX_LEN - 2")
+if not 1 <= INCREMENTAL_MIN_TOKENS <= INCREMENTAL_MAX_TOKENS <= MAX_LEN - 2:
+    raise ValueError("Need 1 <= NER_INCREMENTAL_MIN_TOKENS <= NER_INCREMENTAL_MAX_TOKENS <= MAX_LEN - 2")
+# Backend chạy model: "torch" (eager PyTorch), "onnx" (onnxruntime, cần export_onnx.py trước)
+# hoặc "quantized" (dynamic int8, cần report từ eval_quantized.py)
+NER_BACKENDS = ("torch", "onnx", "quantized")
+NER_BACKEND = os.getenv("NER_BACKEND", "torch")
+ONNX_MODEL_PATH = os.getenv("NER_ONNX_PATH", os.path.join(bert_out_address, "ner_model.onnx"))
+# 0 = để onnxruntime tự chọn
+ONNX_INTRA_OP_THREADS = int(os.getenv("NER_ONNX_THREADS", RUNTIME_PROFILE.get("intra_op_threads", 0)))
+# Snapshot safetensors của models/ (tạo bằng export_safetensors.py), được memory-map khi load
+WEIGHTS_SNAPSHOT_PATH = os.getenv(
+    "NER_WEIGHTS_SNAPSHOT", os.path.join(bert_out_address, "model.safetensors")
+)
+QUANT_REPORT_PATH = os.getenv(
+    "NER_QUANT_REPORT", os.path.join(bert_out_address, "quantization_report.json")
+)
+QUANT_MAX_F1_DROP = float(os.getenv("NER_QUANT_MAX_F1_DROP", "0.01"))
+# Early exit với classifier head ở các layer trung gian (tạo bằng train_exit_heads.py), chỉ cho backend
+# torch/quantized. NER_EXIT_THRESHOLD > 0: mỗi chuỗi dừng ở layer đầu tiên mà mọi token đạt confidence
+# >= ngưỡng. NER_EXIT_LAYERS = N > 0: luôn chỉ chạy N layer đầu rồi dùng head của layer N
+EXIT_HEADS_PATH = os.getenv("NER_EXIT_HEADS", os.path.join(bert_out_address, "exit_heads.pt"))
+EXIT_THRESHOLD = float(os.getenv("NER_EXIT_THRESHOLD", "0"))
+EXIT_LAYERS = int(os.getenv("NER_EXIT_LAYERS", "0"))
+if NER_BACKEND not in NER_BACKENDS:
+    raise ValueError(f"NER_BACKEND must be one of {NER_BACKENDS}")
+if EXIT_THRESHOLD and EXIT_LAYERS:
+    raise ValueError("Set only one of NER_EXIT_THRESHOLD and NER_EXIT_LAYERS")
+if (EXIT_THRESHOLD or EXIT_LAYERS) and NER_BACKEND == "onnx":
+    raise ValueError("Early exit requires NER_BACKEND=torch or quantized")
+
+def load_snapshot_model(path: str = WEIGHTS_SNAPSHOT_PATH):
+    """Dựng model trên meta device rồi gán thẳng tensor memory-mapped từ snapshot safetensors.
+
+    Bỏ qua bước khởi tạo weight ngẫu nhiên và torch.load toàn bộ pytorch_model.bin vào RAM;
+    các worker cùng máy dùng chung page cache của file snapshot.
+    """
+    from safetensors.torch import load_file
+
+    config = BertConfig.from_json_file(os.path.join(bert_out_address, "config.json"))
+    with torch.device("meta"):
+        model = BertForTokenClassification(config, num_labels=len(tag2idx))
+    model.load_state_dict(load_file(path, device="cpu"), assign=True)
+    return model
+
+def load_torch_model():
+    """Load BertForTokenClassification từ models/ ở chế độ eval.
+
+    Ưu tiên snapshot safetensors nếu có (và cài package safetensors), nếu không thì
+    load pytorch_model.bin như cũ.
+    """
+    started = time.perf_counter()
+    model = None
+    if WEIGHTS_SNAPSHOT_PATH and os.path.exists(WEIGHTS_SNAPSHOT_PATH):
+        try:
+            model = load_snapshot_model()
+            STARTUP_TIMINGS["weights_source"] = "safetensors"
+        except ImportError:
+            print("safetensors is not installed, falling back to pytorch_model.bin")
+    if model is None:
+        model = BertForTokenClassification.from_pretrained(
+            bert_out_address, num_labels=len(tag2idx)
+        ).cpu()
+        STARTUP_TIMINGS["weights_source"] = "pytorch_model.bin"
+    STARTUP_TIMINGS["weights_load_s"] = round(time.perf_counter() - started, 3)
+
+    # Đảm bảo model ở chế độ eval và tắt dropout
+    model.eval()
+    for module in model.modules():
+        if module.__class__.__name__.startswith('Dropout'):
+            module.p = 0
+    return model
+
+def loaded_weights_path() -> str:
+    """Đường dẫn file weights mà backend hiện tại đã load (theo STARTUP_TIMINGS["weights_source"])."""
+    return {
+        "safetensors": WEIGHTS_SNAPSHOT_PATH,
+        "pytorch_model.bin": os.path.join(bert_out_address, "pytorch_model.bin"),
+        "onnx": ONNX_MODEL_PATH,
+    }[STARTUP_TIMINGS["weights_source"]]
+
+def weights_fingerprint(weights_path: str) -> str:
+    """Fingerprint của checkpoint: kích thước và mtime của file weights, nội dung config và vocab.
+
+    File weights (vài trăm MB) chỉ lấy kích thước và mtime thay vì hash nội dung để không đọc lại cả file
+    mỗi lần khởi động; copy lại file weights (đổi mtime) cũng đổi fingerprint.
+    """
+    digest = hashlib.sha256()
+    weights_stat = os.stat(weights_path)
+    digest.update(f"{weights_stat.st_size}|{weights_stat.st_mtime_ns}".encode("utf-8"))
+    for name in ("config.json", "vocab.txt"):
+        with open(os.path.join(bert_out_address, name), "rb") as f:
+            digest.update(hashlib.file_digest(f, "sha256").digest())
+    return digest.hexdigest()[:16]
+
+def quantize_model(model):
+    """Dynamic int8 quantization cho các lớp Linear (trả về bản sao, không sửa model gốc)."""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def check_quantization_report(path: str = QUANT_REPORT_PATH, max_f1_drop: float = QUANT_MAX_F1_DROP):
+    """Từ chối chạy model quantized nếu chưa có report, report được đo trên checkpoint hoặc mode khác
+    (NER_DEFAULT_MODE), hoặc entity F1 giảm quá ngưỡng. Gọi sau khi đã load model full-precision."""
+    if not os.path.exists(path):
+        raise RuntimeError(
+            f"Quantization report not found at {path}, run eval_quantized.py first"
+        )
+
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+
+    fingerprint = weights_fingerprint(loaded_weights_path())
+    if report.get("weights_fingerprint") != fingerprint:
+        raise RuntimeError(
+            f"Quantization report at {path} was made for another checkpoint "
+            f"({report.get('weights_fingerprint')}, loaded {fingerprint}), run eval_quantized.py again"
+        )
+    if report.get("mode") != DEFAULT_MODE:
+        raise RuntimeError(
+            f"Quantization report at {path} was made in {report.get('mode')} mode, "
+            f"NER_DEFAULT_MODE is {DEFAULT_MODE}: run eval_quantized.py --mode {DEFAULT_MODE}"
+        )
+
+    f1_drop = report["f1_drop"]
+    if f1_drop > max_f1_drop:
+        raise RuntimeError(
+            f"Quantized model entity F1 drop {f1_drop:.4f} exceeds NER_QUANT_MAX_F1_DROP={max_f1_drop}"
+        )
+    return report
+
+def load_onnx_session(path: str = ONNX_MODEL_PATH, intra_op_threads: int = ONNX_INTRA_OP_THREADS):
+    """Tạo onnxruntime session với graph optimization đầy đủ."""
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError("NER_BACKEND=onnx requires the onnxruntime package") from e
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX model not found at {path}, run export_onnx.py first")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_threads
+    started = time.perf_counter()
+    session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    STARTUP_TIMINGS["weights_source"] = "onnx"
+    STARTUP_TIMINGS["weights_load_s"] = round(time.perf_counter() - started, 3)
+    return session
+
+def torch_forward(model, input_ids: np.ndarray, attention_masks: np.ndarray) -> np.ndarray:
+    """Forward pass PyTorch, trả về logits dạng numpy (batch, seq_len, num_labels)."""
+    with torch.no_grad():
+        logits = model(
+            torch.from_numpy(input_ids),
+            token_type_ids=None,
+            attention_mask=torch.from_numpy(attention_masks),
+        )
+    return logits.detach().cpu().numpy()
+
+def onnx_forward(session, input_ids: np.ndarray, attention_masks: np.ndarray) -> np.ndarray:
+    """Forward pass onnxruntime, cùng contract với torch_forward."""
+    return session.run(
+        ["logits"],
+        {"input_ids": input_ids, "attention_mask": attention_masks.astype(np.int64)},
+    )[0]
+
+def load_exit_heads(model, path: str = EXIT_HEADS_PATH) -> dict:
+    """Đọc head của train_exit_heads.py: {layer (đếm từ 1): (Linear, temperature)}.
+
+    Layer cuối luôn dùng classifier gốc của model. Head học từ nhãn của phiên bản ner_dataset cũ
+    (LABELS_VERSION khác) bị từ chối: phải train và calibrate lại.
+    """
+    from ner_dataset import LABELS_VERSION
 
-bert_model = BertForTokenClassification.from_pretrained(
-    bert_out_address, num_labels=len(tag2idx)
-).cpu()
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Exit heads not found at {path}, run train_exit_heads.py first")
+    checkpoint = torch.load(path, map_location="cpu")
+    if checkpoint.get("labels_version") != LABELS_VERSION:
+        raise ValueError(
+            f"Exit heads at {path} were trained on labels version {checkpoint.get('labels_version', 1)}, "
+            f"current is {LABELS_VERSION}: run train_exit_heads.py again"
+        )
+    num_layers = len(model.bert.encoder.layer)
+    if checkpoint["num_hidden_layers"] != num_layers:
+        raise ValueError(f"Exit heads were trained for {checkpoint['num_hidden_layers']} layers, model has {num_layers}")
+
+    heads = {}
+    for layer in checkpoint["layers"]:
+        weight = checkpoint["state_dict"][f"{layer}.weight"]
+        head = torch.nn.Linear(weight.shape[1], weight.shape[0])
+        head.load_state_dict({"weight": weight, "bias": checkpoint["state_dict"][f"{layer}.bias"]})
+        heads[layer] = (head.eval(), checkpoint["temperatures"][str(layer)])
+    heads[num_layers] = (model.classifier, 1.0)
+    return heads
+
+def early_exit_forward(model, heads: dict, input_ids: np.ndarray, attention_masks: np.ndarray,
+                       threshold: float, max_layer: int) -> tuple:
+    """Forward pass dừng sớm theo từng chuỗi trong batch.
+
+    Sau mỗi layer có head, chuỗi có mọi token (không phải padding) đạt confidence >= threshold
+    lấy logits của head đó và được bỏ khỏi batch; tới max_layer thì mọi chuỗi còn lại dừng.
+    Returns:
+        (logits numpy (batch, seq_len, num_labels) đã chia temperature, layer dừng của từng chuỗi)
+    """
+    with torch.no_grad():
+        ids = torch.from_numpy(input_ids)
+        masks = torch.from_numpy(attention_masks)
+        extended_masks = (1.0 - masks[:, None, None, :]) * -10000.0
+        hidden = model.bert.embeddings(ids, torch.zeros_like(ids))
 
-# Đảm bảo model ở chế độ eval và tắt dropout
-bert_model.eval()
-for module in bert_model.modules():
-    if module.__class__.__name__.startswith('Dropout'):
-        module.p = 0
+        logits = torch.zeros(ids.shape + (len(tag2idx),))
+        exit_layers = np.zeros(len(ids), dtype=np.int64)
+        active = torch.arange(len(ids))
+        for layer, layer_module in enumerate(model.bert.encoder.layer[:max_layer], start=1):
+            hidden = layer_module(hidden, extended_masks)
+            if layer not in heads:
+                continue
+            head, temperature = heads[layer]
+            layer_logits = head(hidden) / temperature
+            if layer == max_layer:
+                done = torch.ones(len(active), dtype=torch.bool)
+            else:
+                confidence = torch.softmax(layer_logits, dim=-1).max(dim=-1).values
+                done = ((confidence >= threshold) | (masks == 0)).all(dim=1)
+
+            logits[active[done]] = layer_logits[done]
+            exit_layers[active[done].numpy()] = layer
+            keep = ~done
+            if not keep.any():
+                break
+            active, hidden, masks, extended_masks = active[keep], hidden[keep], masks[keep], extended_masks[keep]
+    return logits.numpy(), exit_layers
+
+if NER_BACKEND == "quantized":
+    bert_model = load_torch_model()
+    check_quantization_report()
+    bert_model = quantize_model(bert_model)
+elif NER_BACKEND == "torch":
+    bert_model = load_torch_model()
+else:
+    bert_model = None
+onnx_session = load_onnx_session() if NER_BACKEND == "onnx" else None
+
+exit_heads = load_exit_heads(bert_model) if EXIT_THRESHOLD or EXIT_LAYERS else None
+if exit_heads is not None:
+    # Chế độ cắt layer: chỉ dừng ở layer N (ngưỡng vô cực), cần có head cho layer N
+    exit_max_layer = EXIT_LAYERS or len(bert_model.bert.encoder.layer)
+    exit_threshold = EXIT_THRESHOLD if EXIT_THRESHOLD else float("inf")
+    if exit_max_layer not in exit_heads:
+        raise ValueError(f"NER_EXIT_LAYERS must be one of {sorted(exit_heads)}")
+
+def model_forward(input_ids: np.ndarray, attention_masks: np.ndarray) -> np.ndarray:
+    """Forward pass qua backend đang được chọn."""
+    if onnx_session is not None:
+        return onnx_forward(onnx_session, input_ids, attention_masks)
+    if exit_heads is not None:
+        logits, exit_layers = early_exit_forward(
+            bert_model, exit_heads, input_ids, attention_masks, exit_threshold, exit_max_layer
+        )
+        for layer, endpoint in zip(exit_layers.tolist(), batch_endpoints(len(exit_layers))):
+            if endpoint is not None:
+                record_metric(EXIT_LAYER, layer, endpoint=endpoint)
+        return logits
+    return torch_forward(bert_model, input_ids, attention_masks)
 
-tokenizer = BertTokenizer.from_pretrained("bert-base-cased", do_lower_case=False)
+# Tokenizer đọc vocab bert-base-cased đã lưu trong models/, không cần tải qua mạng
+_tokenizer_started = time.perf_counter()
+tokenizer = BertTokenizer.from_pretrained(bert_out_address, do_lower_case=False)
+
+def load_fast_tokenizer():
+    """Load HuggingFace fast (Rust) WordPiece tokenizer từ models/vocab.txt, cùng cấu hình với tokenizer.
+
+    Dựng từ các thành phần thay vì BertWordPieceTokenizer: không đăng ký special token nào, nên
+    "[CLS]", "[SEP]"... nằm giữa văn bản CV được tách như ký tự thường giống custom_tokenize
+    (từ đứng riêng đúng bằng special token được giữ nguyên qua _PROTECTED_WORD_RE).
+    """
+    try:
+        from tokenizers import Tokenizer, normalizers, pre_tokenizers
+        from tokenizers.models import WordPiece
+    except ImportError:
+        print("tokenizers is not installed, using the pure-Python tokenizer")
+        return None
+
+    fast = Tokenizer(
+        WordPiece.from_file(
+            os.path.join(bert_out_address, "vocab.txt"), unk_token="[UNK]", max_input_chars_per_word=100
+        )
+    )
+    fast.normalizer = normalizers.BertNormalizer(
+        clean_text=True, handle_chinese_chars=True, strip_accents=False, lowercase=False
+    )
+    fast.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    return fast
+
+fast_tokenizer = load_fast_tokenizer() if os.getenv("NER_FAST_TOKENIZER", "1") == "1" else None
+STARTUP_TIMINGS["tokenizer_load_s"] = round(time.perf_counter() - _tokenizer_started, 3)
+STARTUP_TIMINGS["total_s"] = round(time.perf_counter() - _import_started, 3)
+print(f"Startup timings ({NER_BACKEND} backend): {STARTUP_TIMINGS}")
 
 # ========== HELPER FUNCTIONS ==========
+# Email, số điện thoại, GitHub URL gộp vào một pattern để quét một lần; hai match chồng nhau
+# (vd. số điện thoại nằm trong email) được giải quyết một lần: match bắt đầu trước thắng,
+# cùng vị trí thì theo thứ tự email > phone > GitHub. Email chỉ được thử ở đầu một đoạn ký tự
+# email (match sớm nhất luôn bắt đầu ở đó), phone bỏ nhánh \d{10} vì nhánh đầu đã bao hết
+_PREPROCESS_RE = re.compile(
+    r"(?<![a-zA-Z0-9._-])[a-zA-Z0-9._-]+@[a-zA-Z0-9._-]+\.[a-zA-Z0-9._-]+"
+    r"|\d{3}[-.]?\d{3}[-.]?\d{4}"
+    r"|github\.com/[a-zA-Z0-9-]+"
+)
+# Tăng khi kết quả tiền xử lý thay đổi (nằm trong model_fingerprint để cache cũ mất hiệu lực).
+# 2: match chồng nhau không còn bị nối hai lần
+PREPROCESS_VERSION = 2
+# Bảng tra ký tự str.split() coi là khoảng trắng theo mã Unicode; ký tự khoảng trắng lớn nhất là U+3000,
+# mã lớn hơn được clip về phần tử cuối (False)
+_WHITESPACE_TABLE = np.array([chr(code).isspace() for code in range(0x3002)])
+_WHITESPACE_TABLE[-1] = False
+
 def preprocess_text(text: str) -> str:
-    """Tiền xử lý văn bản trước khi đưa vào model - deterministic version."""
-    text = " ".join(text.split())
-    
-    # Collect all patterns with their positions first
-    replacements = []
-    
-    # Email pattern
-    email_pattern = r"([a-zA-Z0-9._-]+@[a-zA-Z0-9._-]+\.[a-zA-Z0-9._-]+)"
-    for match in re.finditer(email_pattern, text):
-        replacements.append((match.start(), match.end(), f" {match.group()} "))
-    
-    # Phone pattern  
-    phone_pattern = r"(\d{3}[-.]?\d{3}[-.]?\d{4}|\d{10})"
-    for match in re.finditer(phone_pattern, text):
-        replacements.append((match.start(), match.end(), f" {match.group()} "))
-    
-    # GitHub pattern
-    github_pattern = r"(github\.com/[a-zA-Z0-9-]+)"
-    for match in re.finditer(github_pattern, text):
-        replacements.append((match.start(), match.end(), f" {match.group()} "))
-    
-    # Sort by position (descending) and apply replacements
-    replacements.sort(key=lambda x: x[0], reverse=True)
-    
-    for start, end, replacement in replacements:
-        text = text[:start] + replacement + text[end:]
-    
-    return text
+    """Tiền xử lý văn bản trước khi đưa vào model - deterministic version.
+
+    Chuẩn hoá khoảng trắng rồi thêm dấu cách quanh email, số điện thoại, GitHub URL; re.sub với
+    template dựng kết quả trong một lần nối chuỗi.
+    """
+    return _PREPROCESS_RE.sub(r" \g<0> ", " ".join(text.split()))
+
+def preprocess_texts(texts: list) -> list:
+    """preprocess_text cho một batch CV."""
+    sub = _PREPROCESS_RE.sub
+    return [sub(r" \g<0> ", " ".join(text.split())) for text in texts]
+
+def preprocess_text_with_offsets(text: str) -> tuple:
+    """preprocess_text kèm offset map về văn bản gốc.
+
+    Returns:
+        (processed, offsets): offsets[i] là vị trí trong text của ký tự processed[i]; dấu cách
+        thay cho một đoạn khoảng trắng trỏ về đầu đoạn đó, dấu cách thêm quanh pattern trỏ về
+        đầu/cuối match.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    is_space = _WHITESPACE_TABLE[np.minimum(codes, len(_WHITESPACE_TABLE) - 1)]
+    non_space = np.flatnonzero(~is_space)
+    if not len(non_space):
+        return "", np.zeros(0, dtype=np.int64)
+    # Ký tự còn lại sau chuẩn hoá: ký tự khác khoảng trắng và ký tự đầu của mỗi đoạn khoảng trắng
+    # nằm giữa hai từ. Thêm vị trí ngay sau từ cuối cho dấu cách thêm sau match ở cuối văn bản
+    run_start = is_space & ~np.concatenate(([True], is_space[:-1]))
+    run_start[non_space[-1]:] = False
+    normalized_offsets = np.append(np.flatnonzero(~is_space | run_start), non_space[-1] + 1)
+
+    normalized = " ".join(text.split())
+    boundaries = [position for match in _PREPROCESS_RE.finditer(normalized) for position in match.span()]
+    # Giữa hai vị trí liên tiếp trong boundaries xen kẽ đoạn thường và match, dấu cách thêm ở mỗi biên
+    pieces = [normalized[start:end] for start, end in zip([0] + boundaries, boundaries + [len(normalized)])]
+    indices = np.insert(np.arange(len(normalized)), boundaries, boundaries)
+    return " ".join(pieces), normalized_offsets[indices]
 
 def custom_tokenize(text: str) -> list:
     """Tokenize với xử lý đặc biệt cho một số trường."""
+    return custom_tokenize_with_word_starts(text)[0]
+
+def custom_tokenize_with_word_starts(text: str) -> tuple:
+    """Như custom_tokenize, kèm list cờ cho biết token có mở đầu một từ (tách bởi khoảng trắng) hay không."""
     words = text.split()
     tokens = []
+    word_starts = []
 
     for word in words:
         # Giữ nguyên email
         if "@" in word and "." in word:
-            tokens.append(word)
-            continue
+            pieces = [word]
 
         # Giữ nguyên số điện thoại
-        if re.match(r"\d{3}[-.]?\d{3}[-.]?\d{4}|\d{10}", word):
-            tokens.append(word)
-            continue
+        elif re.match(r"\d{3}[-.]?\d{3}[-.]?\d{4}|\d{10}", word):
+            pieces = [word]
 
         # Giữ nguyên GitHub URL
-        if "github.com" in word.lower():
-            tokens.append(word)
-            continue
+        elif "github.com" in word.lower():
+            pieces = [word]
 
         # Tokenize bình thường cho các từ khác
-        tokens.extend(tokenizer.tokenize(word))
+        else:
+            pieces = tokenizer.tokenize(word)
+
+        tokens.extend(pieces)
+        word_starts.extend([True] + [False] * (len(pieces) - 1) if pieces else [])
 
-    return tokens
+    return tokens, word_starts
 
-def validate_input(text: str) -> bool:
+# Một lần quét cả văn bản để tìm các từ được giữ nguyên như trong custom_tokenize:
+# từ chứa cả "@" và ".", từ bắt đầu bằng số điện thoại, từ chứa "github.com".
+# Thêm special token đứng riêng (giữa khoảng trắng hoặc chữ Hán, vì BasicTokenizer chèn khoảng trắng
+# quanh chữ Hán trước khi tách từ): BasicTokenizer không tách các từ này (never_split).
+_CJK_CHARS = "\u4e00-\u9fff\u3400-\u4dbf\uf900-\ufaff\U00020000-\U0002a6df\U0002a700-\U0002ceaf\U0002f800-\U0002fa1f"
+_PROTECTED_WORD_RE = re.compile(
+    r"(?<!\S)(?:(?=\S*@)(?=\S*\.)|\d{3}[-.]?\d{3}[-.]?\d{4}|\d{10}|(?=\S*(?i:github\.com)))\S*"
+    rf"|(?<![^\s{_CJK_CHARS}])\[(?:UNK|SEP|PAD|CLS|MASK)\](?![^\s{_CJK_CHARS}])"
+)
+
+def fast_tokenize_batch(texts: list) -> list:
+    """Tokenize nhiều văn bản trong một lần gọi fast tokenizer, cùng luật với custom_tokenize.
+
+    Returns:
+        List các tuple (tokens, offsets); offsets là (start, end) theo ký tự trong văn bản đầu vào.
+    """
+    encodings = fast_tokenizer.encode_batch(texts, add_special_tokens=False)
+
+    results = []
+    for text, encoding in zip(texts, encodings):
+        protected = [m.span() for m in _PROTECTED_WORD_RE.finditer(text)]
+        tokens = []
+        offsets = []
+        p = 0
+        emitted = -1
+        for token, (start, end) in zip(encoding.tokens, encoding.offsets):
+            while p < len(protected) and protected[p][1] <= start:
+                p += 1
+            if p < len(protected) and protected[p][0] <= start:
+                # Từ được giữ nguyên: một token duy nhất cho cả từ
+                if emitted != p:
+                    word_start, word_end = protected[p]
+                    tokens.append(text[word_start:word_end])
+                    offsets.append(protected[p])
+                    emitted = p
+                continue
+            tokens.append(token)
+            offsets.append((start, end))
+        results.append((tokens, offsets))
+
+    return results
+
+def tokenize_texts(texts: list) -> list:
+    """Tokenize nhiều văn bản đã tiền xử lý: fast tokenizer nếu có, nếu không thì custom_tokenize.
+
+    Returns:
+        List các tuple (tokens, word_starts); word_starts[i] cho biết token i có khoảng trắng
+        (hoặc đầu văn bản) ngay trước hay không.
+    """
+    if fast_tokenizer is not None:
+        return [
+            (tokens, [start == 0 or text[start - 1].isspace() for start, _ in offsets])
+            for text, (tokens, offsets) in zip(texts, fast_tokenize_batch(texts))
+        ]
+    return [custom_tokenize_with_word_starts(text) for text in texts]
+
+def tokens_to_ids(tokens: list) -> list:
+    """Chuyển token sang id; token được giữ nguyên (email, phone, GitHub) không có trong vocab -> [UNK]."""
+    unk_id = tokenizer.vocab["[UNK]"]
+    return [tokenizer.vocab.get(token, unk_id) for token in tokens]
+
+def validate_input(text: str, max_chars: int = 10000) -> bool:
     """Kiểm tra tính hợp lệ của input."""
     if not text or len(text.strip()) == 0:
         return False
-    if len(text) > 10000:  # Giới hạn độ dài input
+    if len(text) > max_chars:  # Giới hạn độ dài input
         return False
     return True
 
-# ========== PREDICTION FUNCTIONS ==========
-@lru_cache(maxsize=1000)
-def bert_predict_cached(text_hash: str, cv_data: str):
-    """Version có cache của bert_predict."""
-    return bert_predict_internal(cv_data)
-
-def bert_predict_internal(cv_data: str):
-    """Dự đoán NER tags cho CV."""
-    # Tiền xử lý văn bản
-    cv_data = preprocess_text(cv_data)
-
-    # Token id embedding, mask word embedding
-    tokenized_texts = []
-    temp_token = []
-
-    # Add [CLS] at the front
-    temp_token.append("[CLS]")
-
-    # Sử dụng custom tokenization
-    token_list = custom_tokenize(cv_data)
-    temp_token.extend(token_list)
-
-    # Trim the token to fit the length requirement
-    if len(temp_token) > MAX_LEN - 1:
-        temp_token = temp_token[: MAX_LEN - 1]
-
-    # Add [SEP] at the end
-    temp_token.append("[SEP]")
-    tokenized_texts.append(temp_token)
-
-    # Make id embedding
-    input_ids = pad_sequences(
-        [tokenizer.convert_tokens_to_ids(txt) for txt in tokenized_texts],
-        maxlen=MAX_LEN,
-        dtype="long",
-        truncating="post",
-        padding="post",
+def resolve_mode(data: dict) -> str:
+    """Lấy chế độ inference từ request ("truncate", "window", "segment" hoặc "incremental")."""
+    mode = data.get("mode") or request.args.get("mode") or DEFAULT_MODE
+    if mode not in NER_MODES:
+        raise ValueError(f"mode must be one of {NER_MODES}")
+    return mode
+
+def resolve_format(data: dict) -> str:
+    """Lấy định dạng response từ request ("tokens", "columnar" hoặc "entities")."""
+    response_format = data.get("format") or request.args.get("format") or "tokens"
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"format must be one of {RESPONSE_FORMATS}")
+    return response_format
+
+def request_flag(data: dict, name: str) -> bool:
+    """Đọc cờ boolean từ body JSON hoặc query string."""
+    value = data.get(name, request.args.get(name, False))
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+def max_input_chars(mode: str) -> int:
+    """Giới hạn độ dài input theo chế độ inference."""
+    return 10000 if mode == "truncate" else WINDOW_MAX_CHARS
+
+# ========== METRICS ==========
+METRIC_LABELS = ("endpoint", "backend")
+if prometheus_client is not None:
+    REQUESTS_TOTAL = prometheus_client.Counter(
+        "ner_requests_total", "HTTP requests", METRIC_LABELS + ("status",)
+    )
+    ERRORS_TOTAL = prometheus_client.Counter(
+        "ner_errors_total", "HTTP requests answered with 4xx/5xx", METRIC_LABELS + ("status",)
+    )
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        "ner_request_seconds", "End-to-end request latency", METRIC_LABELS,
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    TOKENIZE_SECONDS = prometheus_client.Histogram(
+        "ner_tokenize_seconds", "Preprocessing and tokenization time per call", METRIC_LABELS,
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    )
+    FORWARD_SECONDS = prometheus_client.Histogram(
+        "ner_forward_seconds", "Model forward pass time per batch", METRIC_LABELS,
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+    SEQUENCE_TOKENS = prometheus_client.Histogram(
+        "ner_sequence_tokens", "Wordpiece tokens per CV before truncation", METRIC_LABELS,
+        buckets=(32, 64, 128, 256, 510, 1024, 2048, 4096, 8192),
+    )
+    TRUNCATED_TOTAL = prometheus_client.Counter(
+        "ner_truncated_total", "CVs cut to MAX_LEN in truncate mode", METRIC_LABELS
     )
+    CACHE_LOOKUPS_TOTAL = prometheus_client.Counter(
+        "ner_cache_lookups_total", "Result cache lookups", METRIC_LABELS + ("result",)
+    )
+    WINDOW_CACHE_LOOKUPS_TOTAL = prometheus_client.Counter(
+        "ner_window_cache_lookups_total", "Per-window prediction cache lookups (incremental mode)",
+        METRIC_LABELS + ("result",),
+    )
+    SCHEDULER_QUEUE_WAIT_SECONDS = prometheus_client.Histogram(
+        "ner_scheduler_queue_wait_seconds", "Time sequences wait in the scheduler queue", METRIC_LABELS + ("lane",)
+    )
+    SCHEDULER_QUEUE_DEPTH = prometheus_client.Gauge(
+        "ner_scheduler_queue_depth", "Sequences waiting in the scheduler queue", METRIC_LABELS + ("lane",),
+        multiprocess_mode="livesum",
+    )
+    EXIT_LAYER = prometheus_client.Histogram(
+        "ner_exit_layer", "Encoder layer each sequence exited at (early exit)", METRIC_LABELS,
+        buckets=tuple(range(1, 25)),
+    )
+else:
+    REQUESTS_TOTAL = ERRORS_TOTAL = REQUEST_SECONDS = TOKENIZE_SECONDS = None
+    FORWARD_SECONDS = SEQUENCE_TOKENS = TRUNCATED_TOTAL = CACHE_LOOKUPS_TOTAL = EXIT_LAYER = None
+    WINDOW_CACHE_LOOKUPS_TOTAL = SCHEDULER_QUEUE_WAIT_SECONDS = SCHEDULER_QUEUE_DEPTH = None
 
-    # Make mask embedding
-    attention_masks = [[float(i > 0) for i in ii] for ii in input_ids]
-    segment_ids = [[0] * len(input_id) for input_id in input_ids]
+# Cờ theo thread: thread đang chạy warmup (hoặc scheduler đang chạy batch chỉ gồm chuỗi warmup)
+# không ghi metric và không dùng cache cửa sổ
+_warmup_local = threading.local()
+# Scheduler: endpoint của request đã gửi từng chuỗi trong batch đang chạy (None = chuỗi warmup)
+_batch_local = threading.local()
 
-    # Convert to torch tensors
-    input_ids = torch.tensor(input_ids)
-    attention_masks = torch.tensor(attention_masks)
-    segment_ids = torch.tensor(segment_ids)
+def warming_up() -> bool:
+    """Thread hiện tại có đang chạy warmup hay không."""
+    return getattr(_warmup_local, "active", False)
 
-    # Predict
-    with torch.no_grad():
-        bert_model.eval()
-        outputs = bert_model(
-            input_ids,
-            token_type_ids=None,
-            attention_mask=attention_masks,
+def metrics_endpoint() -> str:
+    """Label endpoint: route của request hiện tại, "internal" khi chạy ngoài request (scheduler, tool)."""
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return "internal"
+
+def batch_endpoints(rows: int) -> list:
+    """Label endpoint cho từng chuỗi của batch đang forward trên thread này.
+
+    Trong scheduler là endpoint của request đã gửi chuỗi đó, nếu không thì endpoint hiện tại.
+    """
+    endpoints = getattr(_batch_local, "endpoints", None)
+    return endpoints if endpoints is not None else [metrics_endpoint()] * rows
+
+def record_metric(metric, value: float = 1, **labels):
+    """Cộng counter, ghi một giá trị vào histogram hoặc đặt giá trị gauge; không làm gì nếu chưa cài prometheus_client."""
+    if metric is None or warming_up():
+        return
+    labels.setdefault("endpoint", metrics_endpoint())
+    child = metric.labels(backend=NER_BACKEND, **labels)
+    if hasattr(child, "observe"):
+        child.observe(value)
+    elif hasattr(child, "set"):
+        child.set(value)
+    else:
+        child.inc(value)
+
+# ========== RESULT CACHE ==========
+def normalized_text_hash(cv_data: str) -> str:
+    """Hash của CV sau khi chuẩn hoá khoảng trắng (preprocess_text cũng bắt đầu bằng bước này)."""
+    return hashlib.md5(" ".join(cv_data.split()).encode("utf-8")).hexdigest()
+
+def model_fingerprint() -> str:
+    """Fingerprint của model đang chạy: file weights, config, vocab và tham số inference.
+
+    Đổi model (hoặc backend, tham số cửa sổ, early exit, cách tiền xử lý) sẽ đổi fingerprint nên cache cũ tự động mất hiệu lực.
+    Checkpoint lấy theo weights_fingerprint (không hash lại cả file weights), file exit heads được hash nội dung.
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        f"{NER_BACKEND}|{MAX_LEN}|{WINDOW_STRIDE}|{WINDOW_OVERLAP}|{IDX2TAG_LIST}|{EXIT_THRESHOLD}|{EXIT_LAYERS}|{PREPROCESS_VERSION}|"
+        f"{INCREMENTAL_MIN_TOKENS}|{INCREMENTAL_MAX_TOKENS}|{INCREMENTAL_CUT_MODULUS}|{SPLIT_VERSION}".encode("utf-8")
+    )
+    digest.update(f"|{weights_fingerprint(loaded_weights_path())}".encode("utf-8"))
+    if exit_heads is not None:
+        with open(EXIT_HEADS_PATH, "rb") as f:
+            digest.update(hashlib.file_digest(f, "sha256").digest())
+    return digest.hexdigest()[:16]
+
+class DiskResultCache:
+    """Cache kết quả NER trên SQLite, key = fingerprint model + mode + hash văn bản đã chuẩn hoá.
+
+    Mỗi thread (và mỗi process sau fork) dùng connection riêng; WAL cho phép nhiều worker
+    đọc/ghi cùng lúc. Entry của model khác được xoá khi khởi động.
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS ner_results (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    tokens TEXT NOT NULL,
+                    tag_ids BLOB NOT NULL,
+                    confidences BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("DELETE FROM ner_results WHERE fingerprint != ?", (fingerprint,))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _key(self, text_hash: str, mode: str) -> str:
+        return f"{self.fingerprint}:{mode}:{text_hash}"
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, text_hash: str, mode: str):
+        """Trả về (temp_token, result_ids, confidence_scores) hoặc None nếu chưa có."""
+        try:
+            row = self._connect().execute(
+                "SELECT tokens, tag_ids, confidences FROM ner_results WHERE key = ?",
+                (self._key(text_hash, mode),),
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._count("errors")
+            print(f"Disk cache read failed: {str(e)}")
+            return None
+
+        if row is None:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        tokens, tag_ids, confidences = row
+        return (
+            json.loads(tokens),
+            np.frombuffer(tag_ids, dtype=np.uint8).astype(np.int64),
+            np.frombuffer(confidences, dtype=np.float32),
         )
-        logits = outputs[0]
 
-    predict_results = logits.detach().cpu().numpy()
-    results_arrays_soft = softmax(predict_results)
-    confidence_scores = np.max(results_arrays_soft, axis=-1)
-    result_list = np.argmax(results_arrays_soft, axis=-1)
+    def put(self, text_hash: str, mode: str, result: tuple):
+        temp_token, result_ids, confidence_scores = result
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ner_results VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        self._key(text_hash, mode),
+                        self.fingerprint,
+                        json.dumps(temp_token, ensure_ascii=False),
+                        np.asarray(result_ids, dtype=np.uint8).tobytes(),
+                        np.asarray(confidence_scores, dtype=np.float32).tobytes(),
+                        time.time(),
+                    ),
+                )
+            self._count("writes")
+        except sqlite3.Error as e:
+            self._count("errors")
+            print(f"Disk cache write failed: {str(e)}")
 
-    token_tag_pairs = []
-    for i, mark in enumerate(attention_masks[0]):
-        if mark > 0:
-            confidence = float(confidence_scores[0][i])
-            token_tag_pairs.append(
-                {
-                    "token": temp_token[i],
-                    "tag": idx2tag[result_list[0][i]],
-                    "position": i,
-                    "confidence": round(confidence, 4),
-                }
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": self.path,
+                "fingerprint": self.fingerprint,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "errors": self.errors,
+            }
+
+disk_cache = DiskResultCache(DISK_CACHE_PATH, model_fingerprint()) if DISK_CACHE_PATH else None
+
+def estimate_result_bytes(result: tuple) -> int:
+    """Ước lượng dung lượng bộ nhớ của một kết quả (list token + hai mảng numpy)."""
+    temp_token, result_ids, confidence_scores = result
+    return (
+        sys.getsizeof(temp_token)
+        + sum(sys.getsizeof(token) for token in temp_token)
+        + result_ids.nbytes
+        + confidence_scores.nbytes
+    )
+
+class MemoryResultCache:
+    """LRU cache trong process, key chỉ gồm (mode, hash), giới hạn theo tổng dung lượng ước lượng.
+
+    Kết quả được lưu ở dạng gọn (tag id uint8, confidence float32); entry quá TTL bị coi là miss.
+    """
+
+    def __init__(self, max_bytes: int, ttl_s: float = 0):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries = OrderedDict()  # key -> (result, size, stored_at)
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            result, size, stored_at = entry
+            if self.ttl_s and time.time() - stored_at > self.ttl_s:
+                del self._entries[key]
+                self.resident_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result: tuple):
+        temp_token, result_ids, confidence_scores = result
+        result = (
+            temp_token,
+            np.asarray(result_ids, dtype=np.uint8),
+            np.asarray(confidence_scores, dtype=np.float32),
+        )
+        size = estimate_result_bytes(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.resident_bytes -= previous[1]
+            self._entries[key] = (result, size, time.time())
+            self.resident_bytes += size
+
+            # Loại entry ít được dùng nhất cho tới khi nằm trong ngân sách
+            while self.resident_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.resident_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+memory_cache = MemoryResultCache(int(MEMORY_CACHE_MAX_MB * 1024 * 1024), MEMORY_CACHE_TTL_S)
+
+def lookup_cached(text_hash: str, mode: str):
+    """Tìm kết quả trong cache bộ nhớ, rồi cache trên đĩa (đưa lên bộ nhớ nếu hit)."""
+    result = memory_cache.get((mode, text_hash))
+    if result is None and disk_cache is not None:
+        result = disk_cache.get(text_hash, mode)
+        if result is not None:
+            memory_cache.put((mode, text_hash), result)
+    record_metric(CACHE_LOOKUPS_TOTAL, result="miss" if result is None else "hit")
+    return result
+
+def store_cached(text_hash: str, mode: str, result: tuple):
+    memory_cache.put((mode, text_hash), result)
+    if disk_cache is not None:
+        disk_cache.put(text_hash, mode, result)
+
+def window_hash(window_tokens: list) -> str:
+    """Hash nội dung một cửa sổ token (wordpiece không chứa khoảng trắng nên nối bằng dấu cách)."""
+    return hashlib.md5(" ".join(window_tokens).encode("utf-8")).hexdigest()
+
+def lookup_cached_window(window_tokens: list):
+    """Dự đoán (result_ids, confidence_scores) đã cache của một cửa sổ ở chế độ "incremental", hoặc None.
+
+    Dùng chung cache bộ nhớ/đĩa với kết quả cả CV, dưới mode riêng "incremental_window".
+    Trong lúc warmup luôn trả về None để model thực sự được chạy.
+    """
+    if warming_up():
+        return None
+    text_hash = window_hash(window_tokens)
+    result = memory_cache.get(("incremental_window", text_hash))
+    if result is None and disk_cache is not None:
+        result = disk_cache.get(text_hash, "incremental_window")
+        if result is not None:
+            memory_cache.put(("incremental_window", text_hash), result)
+    # So lại token phòng trường hợp trùng hash
+    if result is not None and list(result[0]) != window_tokens:
+        result = None
+    record_metric(WINDOW_CACHE_LOOKUPS_TOTAL, result="miss" if result is None else "hit")
+    return None if result is None else (result[1], result[2])
+
+def store_cached_window(window_tokens: list, prediction: tuple):
+    if warming_up():
+        return
+    text_hash = window_hash(window_tokens)
+    result = (window_tokens, prediction[0], prediction[1])
+    memory_cache.put(("incremental_window", text_hash), result)
+    if disk_cache is not None:
+        disk_cache.put(text_hash, "incremental_window", result)
+
+# ========== PREDICTION FUNCTIONS ==========
+def bert_predict_cached(text_hash: str, cv_data: str, mode: str = "truncate"):
+    """Version có cache của bert_predict, lưu kết quả dạng mảng (temp_token, result_ids, confidence_scores)."""
+    result = lookup_cached(text_hash, mode)
+    if result is None:
+        result = predict_cv_batch([cv_data], mode)[0]
+        store_cached(text_hash, mode, result)
+    return result
+
+def prepare_windows(cv_data: str, mode: str = "truncate") -> tuple:
+    """Tiền xử lý, tokenize CV và chia thành các cửa sổ đưa vào model."""
+    return prepare_windows_batch([cv_data], mode)[0]
+
+def prepare_windows_batch(cv_list: list, mode: str = "truncate") -> list:
+    """Tiền xử lý và tokenize nhiều CV trong một lần gọi tokenizer, rồi chia cửa sổ cho từng CV."""
+    started = time.perf_counter()
+    tokenized = tokenize_texts(preprocess_texts(cv_list))
+    record_metric(TOKENIZE_SECONDS, time.perf_counter() - started)
+
+    for content_tokens, _ in tokenized:
+        record_metric(SEQUENCE_TOKENS, len(content_tokens))
+        if mode == "truncate" and len(content_tokens) > MAX_LEN - 2:
+            record_metric(TRUNCATED_TOTAL)
+    return [build_windows(content_tokens, word_starts, mode) for content_tokens, word_starts in tokenized]
+
+def build_windows(content_tokens: list, word_starts: list, mode: str = "truncate") -> tuple:
+    """Chia token nội dung thành các cửa sổ đưa vào model (word_starts như trong tokenize_texts).
+
+    Returns:
+        (content_tokens, windows): content_tokens là token nội dung (không có [CLS]/[SEP]),
+        windows là list các tuple (start, window_tokens) với start là vị trí bắt đầu
+        của cửa sổ trong content_tokens.
+    """
+    if mode in ("segment", "incremental"):
+        if mode == "segment":
+            chunks = split_segments(content_tokens, word_starts)
+        else:
+            chunks = split_incremental(content_tokens)
+        return content_tokens, [(start, ["[CLS]"] + chunk + ["[SEP]"]) for start, chunk in chunks]
+
+    if mode != "window" or len(content_tokens) <= MAX_LEN - 2:
+        # Trim the token to fit the length requirement, add [CLS] at the front and [SEP] at the end
+        content_tokens = content_tokens[: MAX_LEN - 2]
+        return content_tokens, [(0, ["[CLS]"] + content_tokens + ["[SEP]"])]
+
+    window_len = WINDOW_STRIDE + WINDOW_OVERLAP
+    windows = []
+    start = 0
+    while True:
+        chunk = content_tokens[start : start + window_len]
+        windows.append((start, ["[CLS]"] + chunk + ["[SEP]"]))
+        if start + window_len >= len(content_tokens):
+            break
+        start += WINDOW_STRIDE
+
+    return content_tokens, windows
+
+def split_segments(content_tokens: list, word_starts: list) -> list:
+    """Chia token nội dung tại mỗi "." đứng riêng thành một từ: "." mở đầu đoạn tiếp theo.
+
+    Chỉ cắt khi cả token trước và token sau tách khỏi "." bởi khoảng trắng và token sau không phải
+    wordpiece "##", nên "3.5", "Node.js" hay "B.Sc" không bị cắt (get_train_data thì cắt ở mọi từ "."
+    có tag O, không biết tag lúc suy luận nên ở đây chỉ dựa vào khoảng trắng).
+    Đoạn dài hơn MAX_LEN - 2 token được cắt tiếp thành các đoạn liên tiếp không chồng lấp.
+    Returns:
+        List các tuple (start, chunk) với start là vị trí của đoạn trong content_tokens.
+    """
+    boundaries = [
+        i
+        for i, token in enumerate(content_tokens)
+        if token == "."
+        and i > 0
+        and word_starts[i]
+        and (i + 1 == len(content_tokens) or (word_starts[i + 1] and not content_tokens[i + 1].startswith("##")))
+    ]
+    segments = []
+    last = 0
+    for end in boundaries + [len(content_tokens)]:
+        for start in range(last, end, MAX_LEN - 2):
+            segments.append((start, content_tokens[start : min(end, start + MAX_LEN - 2)]))
+        last = end
+    return segments or [(0, [])]
+
+def split_incremental(content_tokens: list) -> list:
+    """Chia token nội dung thành các cửa sổ không chồng lấp, ranh giới chỉ phụ thuộc nội dung gần đó.
+
+    Cửa sổ được cắt trước token "." hoặc token có crc32 chia hết cho INCREMENTAL_CUT_MODULUS khi đã đủ
+    INCREMENTAL_MIN_TOKENS token, và bắt buộc cắt ở INCREMENTAL_MAX_TOKENS token. Không cắt trước
+    wordpiece "##" để một từ không bị chia sang hai cửa sổ: khi tới INCREMENTAL_MAX_TOKENS giữa một từ,
+    cửa sổ được kéo dài tới hết từ đó (chỉ cắt giữa từ khi chạm MAX_LEN - 2 token). Thêm/bớt token ở
+    một chỗ chỉ làm đổi các cửa sổ quanh chỗ đó, các cửa sổ phía sau vẫn giữ nguyên nội dung.
+    Returns:
+        List các tuple (start, chunk) với start là vị trí của cửa sổ trong content_tokens.
+    """
+    chunks = []
+    start = 0
+    for i, token in enumerate(content_tokens):
+        length = i - start
+        if length >= MAX_LEN - 2 or (
+            not token.startswith("##")
+            and (
+                length >= INCREMENTAL_MAX_TOKENS
+                or (
+                    length >= INCREMENTAL_MIN_TOKENS
+                    and (token == "." or zlib.crc32(token.encode("utf-8")) % INCREMENTAL_CUT_MODULUS == 0)
+                )
             )
+        ):
+            chunks.append((start, content_tokens[start:i]))
+            start = i
+    chunks.append((start, content_tokens[start:]))
+    return chunks
+
+def pad_token_ids(id_lists: list, maxlen: int) -> np.ndarray:
+    """Pad (post) và cắt (post) các list id về cùng độ dài bằng số 0 ([PAD])."""
+    input_ids = np.zeros((len(id_lists), maxlen), dtype=np.int64)
+    for b, ids in enumerate(id_lists):
+        ids = ids[:maxlen]
+        input_ids[b, : len(ids)] = ids
+    return input_ids
+
+def predict_token_batch(token_batch: list, forward=None) -> list:
+    """Chạy một forward pass cho nhiều chuỗi token, chỉ pad tới chuỗi dài nhất trong batch.
+
+    forward mặc định là model_forward của backend đang chạy; các tool so sánh model
+    có thể truyền hàm forward khác.
+
+    Returns:
+        List các tuple (result_ids, confidence_scores), mỗi phần tử là mảng numpy
+        có độ dài đúng bằng chuỗi token tương ứng.
+    """
+    batch_len = max(len(temp_token) for temp_token in token_batch)
+
+    # Make id embedding (dynamic padding)
+    input_ids = pad_token_ids([tokens_to_ids(txt) for txt in token_batch], batch_len)
+
+    # Make mask embedding
+    attention_masks = (input_ids > 0).astype(np.float32)
+
+    # Predict
+    started = time.perf_counter()
+    predict_results = (forward or model_forward)(input_ids, attention_masks)
+    if forward is None:
+        # Batch gộp từ nhiều endpoint (scheduler) được ghi một lần cho mỗi endpoint có chuỗi trong batch
+        elapsed = time.perf_counter() - started
+        for endpoint in dict.fromkeys(batch_endpoints(len(token_batch))):
+            if endpoint is not None:
+                record_metric(FORWARD_SECONDS, elapsed, endpoint=endpoint)
+    # Softmax trên từng token (trục tag): xác suất lớn nhất = 1 / sum(exp(logit - max_logit))
+    shifted = predict_results - predict_results.max(axis=-1, keepdims=True)
+    confidence_scores = 1.0 / np.exp(shifted).sum(axis=-1)
+    result_list = np.argmax(predict_results, axis=-1)
 
+    return [
+        (result_list[b, : len(temp_token)], confidence_scores[b, : len(temp_token)])
+        for b, temp_token in enumerate(token_batch)
+    ]
+
+def build_token_tag_pairs(temp_token: list, result_ids, confidence_scores) -> list:
+    """Ghép token với tag dự đoán và độ tin cậy."""
+    token_tag_pairs = []
+    for i, token in enumerate(temp_token):
+        token_tag_pairs.append(
+            {
+                "token": token,
+                "tag": idx2tag[int(result_ids[i])],
+                "position": i,
+                "confidence": round(float(confidence_scores[i]), 4),
+            }
+        )
     return token_tag_pairs
 
-def bert_predict(cv_data: str):
-    """Dự đoán NER tags cho CV với caching."""
+def merge_window_predictions(content_tokens: list, windows: list, predictions: list) -> tuple:
+    """Gộp dự đoán của các cửa sổ thành một chuỗi token/tag duy nhất.
+
+    Ở vùng chồng lấp, mỗi token lấy tag của cửa sổ có confidence cao nhất.
+    Returns:
+        (temp_token, result_ids, confidence_scores) cho chuỗi [CLS] + content_tokens + [SEP].
+    """
+    if len(windows) == 1:
+        return windows[0][1], predictions[0][0], predictions[0][1]
+
+    seq_len = len(content_tokens) + 2
+    result_ids = np.zeros(seq_len, dtype=np.int64)
+    confidence_scores = np.full(seq_len, -1.0, dtype=np.float32)
+
+    for (start, window_tokens), (window_ids, window_conf) in zip(windows, predictions):
+        # Token nội dung thứ j nằm ở vị trí j + 1 của chuỗi đầy đủ (sau [CLS])
+        span = slice(start + 1, start + len(window_tokens) - 1)
+        better = window_conf[1:-1] > confidence_scores[span]
+        result_ids[span] = np.where(better, window_ids[1:-1], result_ids[span])
+        confidence_scores[span] = np.where(better, window_conf[1:-1], confidence_scores[span])
+
+    # [CLS] lấy từ cửa sổ đầu, [SEP] lấy từ cửa sổ cuối
+    result_ids[0], confidence_scores[0] = predictions[0][0][0], predictions[0][1][0]
+    result_ids[-1], confidence_scores[-1] = predictions[-1][0][-1], predictions[-1][1][-1]
+
+    return ["[CLS]"] + content_tokens + ["[SEP]"], result_ids, confidence_scores
+
+def current_lane() -> str:
+    """Lane ưu tiên của request hiện tại (chọn trong select_lane), "interactive" khi chạy ngoài request."""
+    if has_request_context() and "lane" in g:
+        return g.lane
+    return "interactive"
+
+def run_inference(token_sequences: list) -> list:
+    """Chạy model cho nhiều chuỗi token: qua scheduler nếu được bật, nếu không thì chia batch trực tiếp.
+
+    Request đang được profile chạy trực tiếp trên thread xử lý request (không qua scheduler): cProfile
+    và torch.profiler chỉ thấy thread đã bật chúng, nên forward pass phải chạy trên thread đó mới tách
+    được thời gian forward khỏi phần còn lại. Profile vì vậy không có thời gian chờ trong hàng đợi
+    (xem /scheduler/stats và metric ner_scheduler_queue_wait_seconds).
+    """
+    if SCHEDULER_ENABLED and active_profile_kind() is None:
+        return inference_scheduler.predict(token_sequences, current_lane())
+
+    predictions = []
+    for start in range(0, len(token_sequences), BATCH_SIZE):
+        predictions.extend(predict_token_batch(token_sequences[start : start + BATCH_SIZE]))
+    return predictions
+
+def build_columnar(temp_token: list, result_ids, confidence_scores, drop_o: bool = False) -> dict:
+    """Dựng response dạng cột: các mảng song song, tag là id trong IDX2TAG_LIST.
+
+    drop_o=True bỏ các token có tag "O"; positions giữ vị trí gốc của token còn lại.
+    """
+    positions = np.arange(len(temp_token))
+    if drop_o:
+        positions = positions[result_ids != tag2idx["O"]]
+        tokens = [temp_token[i] for i in positions.tolist()]
+    else:
+        tokens = list(temp_token)
+
+    return {
+        "tokens": tokens,
+        "tags": result_ids[positions].tolist(),
+        "positions": positions.tolist(),
+        "confidences": np.round(confidence_scores[positions].astype(np.float64), 4).tolist(),
+    }
+
+def build_entities(temp_token: list, result_ids, confidence_scores) -> list:
+    """Ghép token theo tag BILUO thành entity, kèm span token và confidence trung bình.
+
+    Span và confidence phủ mọi token của text (với B- I-... không có L- là tới I- cuối), không dùng
+    end_position tương thích concatenate_tokens vốn dừng trước I- đầu tiên.
+    """
+    entities = []
+    for text, entity_type, start, _, last in entity_decoder.decode(temp_token, result_ids, with_last=True):
+        entities.append(
+            {
+                "text": text,
+                "type": entity_type,
+                "start": start,
+                "end": last,
+                "confidence": round(float(np.mean(confidence_scores[start : last + 1])), 4),
+            }
+        )
+    return entities
+
+def bert_predict_internal(cv_data: str, mode: str = "truncate"):
+    """Dự đoán NER tags cho CV.
+
+    Ở chế độ "window", "segment" và "incremental", mọi cửa sổ (đoạn) của CV được gửi cùng lúc,
+    sắp theo độ dài thành các micro-batch rồi ghép lại theo đúng vị trí trong CV.
+    """
+    return build_token_tag_pairs(*predict_cv_batch([cv_data], mode)[0])
+
+def bert_predict_batch_internal(cv_list: list, mode: str = "truncate") -> list:
+    """Dự đoán NER tags cho nhiều CV, chạy theo batch và trả về đúng thứ tự đầu vào."""
+    return [build_token_tag_pairs(*result) for result in predict_cv_batch(cv_list, mode)]
+
+def predict_cv_batch(cv_list: list, mode: str = "truncate") -> list:
+    """Chạy NER cho nhiều CV, trả về (temp_token, result_ids, confidence_scores) theo đúng thứ tự đầu vào.
+
+    Ở chế độ "incremental", cửa sổ đã có dự đoán trong cache không chạy lại model.
+    """
+    prepared = prepare_windows_batch(cv_list, mode)
+
+    # Trải phẳng cửa sổ của mọi CV, sắp xếp theo độ dài để mỗi batch ít padding
+    flat = [
+        (k, w, window_tokens)
+        for k, (_, windows) in enumerate(prepared)
+        for w, (_, window_tokens) in enumerate(windows)
+    ]
+    predictions = [[None] * len(windows) for _, windows in prepared]
+    if mode == "incremental":
+        pending = []
+        for k, w, window_tokens in flat:
+            predictions[k][w] = lookup_cached_window(window_tokens)
+            if predictions[k][w] is None:
+                pending.append((k, w, window_tokens))
+        flat = pending
+    flat.sort(key=lambda item: len(item[2]))
+
+    if flat:
+        for (k, w, window_tokens), prediction in zip(
+            flat, run_inference([window_tokens for _, _, window_tokens in flat])
+        ):
+            predictions[k][w] = prediction
+            if mode == "incremental":
+                store_cached_window(window_tokens, prediction)
+
+    return [
+        merge_window_predictions(content_tokens, windows, predictions[k])
+        for k, (content_tokens, windows) in enumerate(prepared)
+    ]
+
+def predict_cv_batch_cached(cv_list: list, mode: str = "truncate") -> list:
+    """predict_cv_batch có dùng cache: chỉ các CV chưa có trong cache (và không trùng nhau)
+    mới được chạy model, trong cùng một lần gọi batch."""
+    text_hashes = [normalized_text_hash(cv_data) for cv_data in cv_list]
+    results = {}
+    missing = {}
+    for text_hash, cv_data in zip(text_hashes, cv_list):
+        if text_hash in results or text_hash in missing:
+            continue
+        cached = lookup_cached(text_hash, mode)
+        if cached is not None:
+            results[text_hash] = cached
+        else:
+            missing[text_hash] = cv_data
+
+    if missing:
+        for text_hash, result in zip(missing, predict_cv_batch(list(missing.values()), mode)):
+            results[text_hash] = result
+            store_cached(text_hash, mode, result)
+
+    return [results[text_hash] for text_hash in text_hashes]
+
+def bert_predict_arrays(cv_data: str, mode: str = "truncate") -> tuple:
+    """Dự đoán NER tags cho CV với caching, trả về dạng mảng."""
     # Tạo hash để cache
-    text_hash = hashlib.md5(cv_data.encode('utf-8')).hexdigest()
-    return bert_predict_cached(text_hash, cv_data)
+    text_hash = normalized_text_hash(cv_data)
+    return bert_predict_cached(text_hash, cv_data, mode)
+
+def bert_predict(cv_data: str, mode: str = "truncate"):
+    """Dự đoán NER tags cho CV với caching."""
+    return build_token_tag_pairs(*bert_predict_arrays(cv_data, mode))
+
+# ========== INFERENCE SCHEDULER ==========
+class InferenceScheduler:
+    """Gom chuỗi token từ nhiều request thành micro-batch, chạy trên một worker thread duy nhất.
+
+    Các request handler chỉ đưa chuỗi token vào hàng đợi của lane tương ứng và chờ Future; worker
+    lấy tối đa max_batch_size chuỗi (hoặc chờ tối đa max_wait_ms kể từ chuỗi đầu tiên), chạy một
+    forward pass rồi trả kết quả cho từng Future.
+
+    Batch lấy lane "interactive" trước, chỗ còn lại cho "bulk". Khi chuỗi bulk cũ nhất đã chờ quá
+    bulk_max_wait_ms, bulk_share phần của batch được dành cho bulk trước để bulk không bị đói.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, bulk_max_wait_ms: float = 1000,
+                 bulk_share: float = 0.25, history: int = 1000):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.bulk_max_wait = bulk_max_wait_ms / 1000.0
+        self.bulk_slots = max(1, int(max_batch_size * bulk_share))
+        self._lanes = {lane: deque() for lane in SCHEDULER_LANES}
+        self._ready = threading.Condition()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        # Thống kê: cửa sổ trượt cho percentiles và bộ đếm tích luỹ
+        self._batch_sizes = deque(maxlen=history)
+        self._queue_waits_ms = {lane: deque(maxlen=history) for lane in SCHEDULER_LANES}
+        self._forward_ms = deque(maxlen=history)
+        self._total_batches = 0
+        self._total_sequences = {lane: 0 for lane in SCHEDULER_LANES}
+        self._total_errors = 0
+        self._starvation_batches = 0
+
+    def _ensure_worker(self):
+        """Khởi động worker khi có request đầu tiên (và khởi động lại sau khi fork)."""
+        with self._lock:
+            if self._worker is None or self._worker_pid != os.getpid():
+                self._lanes = {lane: deque() for lane in SCHEDULER_LANES}
+                self._ready = threading.Condition()
+                self._worker_pid = os.getpid()
+                self._worker = threading.Thread(
+                    target=self._run, name="ner-inference-scheduler", daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, token_sequences: list, lane: str = "interactive") -> list:
+        """Đưa các chuỗi token vào hàng đợi của lane, trả về list Future theo đúng thứ tự."""
+        if lane not in SCHEDULER_LANES:
+            raise ValueError(f"lane must be one of {SCHEDULER_LANES}")
+        self._ensure_worker()
+        # Metric của chuỗi được ghi trên worker thread với endpoint của request gửi nó
+        endpoint = None if warming_up() else metrics_endpoint()
+        futures = []
+        with self._ready:
+            enqueued = time.perf_counter()
+            for temp_token in token_sequences:
+                future = Future()
+                self._lanes[lane].append((temp_token, future, enqueued, lane, endpoint))
+                futures.append(future)
+            self._ready.notify()
+        return futures
+
+    def predict(self, token_sequences: list, lane: str = "interactive") -> list:
+        """Dự đoán đồng bộ: submit rồi chờ toàn bộ kết quả."""
+        return [future.result() for future in self.submit(token_sequences, lane)]
+
+    def _pending(self) -> int:
+        return sum(len(items) for items in self._lanes.values())
+
+    def _collect_batch(self) -> tuple:
+        """Chờ đủ batch hoặc hết max_wait kể từ chuỗi cũ nhất, rồi lấy batch theo độ ưu tiên.
+
+        Returns:
+            (batch, starved): starved=True nếu batch có phần dành riêng cho bulk đang bị đói.
+        """
+        with self._ready:
+            while not self._pending():
+                self._ready.wait()
+            deadline = min(items[0][2] for items in self._lanes.values() if items) + self.max_wait
+            while self._pending() < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._ready.wait(remaining)
+
+            interactive, bulk = self._lanes["interactive"], self._lanes["bulk"]
+            starved = bool(interactive and bulk and time.perf_counter() - bulk[0][2] >= self.bulk_max_wait)
+            batch = [bulk.popleft() for _ in range(min(len(bulk), self.bulk_slots))] if starved else []
+            for items in (interactive, bulk):
+                while items and len(batch) < self.max_batch_size:
+                    batch.append(items.popleft())
+            depths = {lane: len(items) for lane, items in self._lanes.items()}
+        # Chỉ ghi từ worker thread để gauge có một bộ label duy nhất (endpoint "internal")
+        for lane, depth in depths.items():
+            record_metric(SCHEDULER_QUEUE_DEPTH, depth, lane=lane)
+        return batch, starved
+
+    def _run(self):
+        while True:
+            batch, starved = self._collect_batch()
+            # Batch chỉ gồm chuỗi của warmup: không ghi metric
+            _warmup_local.active = all(endpoint is None for _, _, _, _, endpoint in batch)
+            _batch_local.endpoints = [endpoint for _, _, _, _, endpoint in batch]
+            try:
+                self._run_batch(batch, starved)
+            except Exception as e:
+                # Lỗi ngoài forward pass (thống kê, metric, trả kết quả) chỉ làm hỏng batch này,
+                # worker vẫn chạy tiếp cho các request sau
+                print(f"Scheduler batch failed: {e!r}")
+                self._fail_batch(batch, e)
+            finally:
+                _warmup_local.active = False
+                _batch_local.endpoints = None
+
+    def _fail_batch(self, batch: list, error: Exception):
+        with self._lock:
+            self._total_errors += 1
+        for _, future, _, _, _ in batch:
+            # Future đã có kết quả hoặc đã bị huỷ: set_exception sẽ raise InvalidStateError
+            if not future.done():
+                future.set_exception(error)
+
+    def _run_batch(self, batch: list, starved: bool):
+        started = time.perf_counter()
+        try:
+            predictions = predict_token_batch([temp_token for temp_token, _, _, _, _ in batch])
+        except Exception as e:
+            self._fail_batch(batch, e)
+            return
+        finished = time.perf_counter()
+
+        with self._lock:
+            self._total_batches += 1
+            self._starvation_batches += starved
+            self._batch_sizes.append(len(batch))
+            self._forward_ms.append((finished - started) * 1000)
+            for _, _, enqueued, lane, _ in batch:
+                self._total_sequences[lane] += 1
+                self._queue_waits_ms[lane].append((started - enqueued) * 1000)
+        for _, _, enqueued, lane, endpoint in batch:
+            if endpoint is not None:
+                record_metric(SCHEDULER_QUEUE_WAIT_SECONDS, started - enqueued, lane=lane, endpoint=endpoint)
+
+        for (_, future, _, _, _), prediction in zip(batch, predictions):
+            if not future.done():
+                future.set_result(prediction)
+
+    def stats(self) -> dict:
+        """Thống kê batch size, thời gian forward pass, độ sâu hàng đợi và thời gian chờ theo lane."""
+
+        def summarize(values):
+            if not values:
+                return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+            arr = np.asarray(values, dtype=np.float64)
+            return {
+                "mean": round(float(arr.mean()), 3),
+                "p50": round(float(np.percentile(arr, 50)), 3),
+                "p95": round(float(np.percentile(arr, 95)), 3),
+                "max": round(float(arr.max()), 3),
+            }
+
+        with self._ready:
+            depths = {lane: len(items) for lane, items in self._lanes.items()}
+        with self._lock:
+            return {
+                "enabled": SCHEDULER_ENABLED,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "bulk_max_wait_ms": self.bulk_max_wait * 1000,
+                "bulk_slots": self.bulk_slots,
+                "queue_depth": sum(depths.values()),
+                "total_batches": self._total_batches,
+                "total_sequences": sum(self._total_sequences.values()),
+                "total_errors": self._total_errors,
+                "starvation_batches": self._starvation_batches,
+                "batch_size": summarize(self._batch_sizes),
+                "queue_wait_ms": summarize([wait for waits in self._queue_waits_ms.values() for wait in waits]),
+                "forward_ms": summarize(self._forward_ms),
+                "lanes": {
+                    lane: {
+                        "queue_depth": depths[lane],
+                        "total_sequences": self._total_sequences[lane],
+                        "queue_wait_ms": summarize(self._queue_waits_ms[lane]),
+                    }
+                    for lane in SCHEDULER_LANES
+                },
+            }
+
+inference_scheduler = InferenceScheduler(
+    SCHEDULER_MAX_BATCH, SCHEDULER_MAX_WAIT_MS, SCHEDULER_BULK_MAX_WAIT_MS, SCHEDULER_BULK_SHARE
+)
+
+# ========== WARMUP ==========
+# CV giả cho warmup: đủ các loại nội dung (email, số điện thoại, GitHub, kỹ năng, học vấn), lặp lại cho đủ dài
+WARMUP_CV = (
+    "Nguyen Van A\nSoftware Engineer\n"
+    "Email: nguyenvana@example.com Phone: 0912345678 github.com/nguyenvana\n"
+    "Skills: Python, Java, SQL, Docker, Kubernetes, React, Node.js.\n"
+    "Experience: Backend Developer at ABC Technology Company (2019 - 2023). "
+    "Built REST APIs, message queues and data pipelines.\n"
+    "Education: Bachelor of Computer Science, Ho Chi Minh City University of Technology, GPA 3.5.\n"
+)
+# Trạng thái warmup của process này: "pending" -> "running" -> "ready" hoặc "failed"
+warmup_state = {"status": "ready" if not WARMUP_ENABLED else "pending", "error": None}
+model_ready = threading.Event()
+if not WARMUP_ENABLED:
+    model_ready.set()
+
+def warmup_model() -> dict:
+    """Chạy CV giả qua pipeline để cấp phát bộ nhớ và khởi tạo kernel trước request thật.
+
+    Mỗi độ dài trong WARMUP_LENGTHS chạy một batch đầy (qua scheduler nếu được bật), sau đó
+    một CV qua predict_cv_batch ở DEFAULT_MODE. Không dùng cache kết quả và cache cửa sổ,
+    không ghi metric (chạy với cờ warming_up).
+    Returns:
+        Thời gian (giây) của từng độ dài và của cả quá trình.
+    """
+    timings = {}
+    started = time.perf_counter()
+    content_tokens = prepare_windows(WARMUP_CV * 20, "truncate")[0]
+    batch = min(BATCH_SIZE, SCHEDULER_MAX_BATCH) if SCHEDULER_ENABLED else BATCH_SIZE
+    for length in WARMUP_LENGTHS:
+        length_started = time.perf_counter()
+        tokens = ["[CLS]"] + content_tokens[: length - 2] + ["[SEP]"]
+        predictions = run_inference([tokens] * batch)
+        entity_decoder.decode(tokens, predictions[0][0])
+        timings[f"length_{length}_s"] = round(time.perf_counter() - length_started, 3)
+
+    pipeline_started = time.perf_counter()
+    predict_cv_batch([WARMUP_CV], DEFAULT_MODE)
+    timings["pipeline_s"] = round(time.perf_counter() - pipeline_started, 3)
+    timings["total_s"] = round(time.perf_counter() - started, 3)
+    return timings
+
+def run_warmup():
+    """Warmup trong process hiện tại rồi đánh dấu sẵn sàng; lỗi giữ worker ở trạng thái unready."""
+    _warmup_local.active = True
+    try:
+        STARTUP_TIMINGS["warmup"] = warmup_model()
+    except Exception as e:
+        warmup_state.update(status="failed", error=str(e))
+        print(f"Warmup failed in worker {os.getpid()}: {str(e)}")
+        return
+    finally:
+        _warmup_local.active = False
+    warmup_state["status"] = "ready"
+    model_ready.set()
+    print(f"Worker {os.getpid()} warmed up: {STARTUP_TIMINGS['warmup']}")
+
+_warmup_lock = threading.Lock()
+
+def start_warmup():
+    """Chạy warmup (một lần mỗi process) trên thread riêng để server vẫn trả lời /ready (503) trong lúc warmup."""
+    with _warmup_lock:
+        if WARMUP_ENABLED and warmup_state["status"] == "pending":
+            warmup_state["status"] = "running"
+            threading.Thread(target=run_warmup, name="ner-warmup", daemon=True).start()
 
 # ========== FLASK APP ==========
 app = Flask(__name__)
+install_request_profiler(app, PROFILE_TOKEN, PROFILE_DIR, PROFILE_SAMPLE_RATE, max_files=PROFILE_MAX_FILES)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def ensure_warmup_started():
+    """Bắt đầu warmup ở request đầu tiên của process (gunicorn, flask run, app được import);
+    run_worker thì đã bắt đầu ngay lúc khởi động."""
+    if warmup_state["status"] == "pending":
+        start_warmup()
+
+# Endpoint chạy model: chỉ các endpoint này đọc (và kiểm tra) X-Priority
+INFERENCE_ENDPOINTS = ("parse_resume", "parse_resume_batch")
+
+@app.before_request
+def select_lane():
+    """Chọn lane ưu tiên cho request: header X-Priority (hoặc ?priority=), mặc định theo endpoint."""
+    if request.endpoint not in INFERENCE_ENDPOINTS:
+        return None
+    lane = request.headers.get("X-Priority") or request.args.get("priority")
+    if lane is None:
+        lane = "bulk" if request.endpoint == "parse_resume_batch" else "interactive"
+    elif lane not in SCHEDULER_LANES:
+        return jsonify({"error": f"priority must be one of {SCHEDULER_LANES}"}), 400
+    g.lane = lane
+    return None
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    """Ghi số request, lỗi và latency theo endpoint cho /metrics."""
+    if request.path not in ("/metrics", "/health", "/ready"):
+        status = str(response.status_code)
+        record_metric(REQUESTS_TOTAL, status=status)
+        if response.status_code >= 400:
+            record_metric(ERRORS_TOTAL, status=status)
+        if "request_started" in g:
+            record_metric(REQUEST_SECONDS, time.perf_counter() - g.request_started)
+    return response
+
+def encode_response(payload: dict) -> Response:
+    """Serialize response theo content negotiation.
+
+    Trả msgpack nếu client Accept application/msgpack (và đã cài msgpack), ngược lại JSON gọn;
+    nén gzip nếu Accept-Encoding cho phép.
+    """
+    best = request.accept_mimetypes.best_match(["application/json", "application/msgpack"])
+    if best == "application/msgpack" and msgpack is not None:
+        body = msgpack.packb(payload, use_bin_type=True)
+        mimetype = "application/msgpack"
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        mimetype = "application/json"
+
+    response = Response(body, mimetype=mimetype)
+    if request.accept_encodings["gzip"] > 0:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept, Accept-Encoding"
+    return response
 
 @app.route("/resume_parsing", methods=["POST"])
 def parse_resume():
@@ -322,10 +1666,40 @@ def parse_resume():
 
         cv_content = data["cv"]
 
-        if not validate_input(cv_content):
+        try:
+            mode = resolve_mode(data)
+            response_format = resolve_format(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if not validate_input(cv_content, max_input_chars(mode)):
             return jsonify({"error": "Invalid input text"}), 400
 
-        tokens = bert_predict(cv_content)
+        if response_format == "entities":
+            return encode_response(
+                {
+                    "format": "entities",
+                    "entities": build_entities(*bert_predict_arrays(cv_content, mode)),
+                    "status": "success",
+                    "processed_at": datetime.now().isoformat(),
+                }
+            )
+
+        if response_format == "columnar":
+            columnar = build_columnar(
+                *bert_predict_arrays(cv_content, mode), drop_o=request_flag(data, "drop_o")
+            )
+            return encode_response(
+                {
+                    "format": "columnar",
+                    "idx2tag": IDX2TAG_LIST,
+                    **columnar,
+                    "status": "success",
+                    "processed_at": datetime.now().isoformat(),
+                }
+            )
+
+        tokens = bert_predict(cv_content, mode)
         print(f"Generated {len(tokens)} tokens")
         print("Sample tokens:", tokens[:5])
 
@@ -341,5 +1715,248 @@ def parse_resume():
         print(f"Error processing request: {str(e)}")
         return jsonify({"error": "Internal server error", "details": str(e)}), 500
 
+@app.route("/resume_parsing/batch", methods=["POST"])
+def parse_resume_batch():
+    """API endpoint để parse nhiều CV trong một request."""
+    try:
+        data = request.get_json()
+
+        if "cvs" not in data or not isinstance(data["cvs"], list):
+            return jsonify({"error": "Missing cvs field"}), 400
+
+        cv_list = data["cvs"]
+
+        if not cv_list or len(cv_list) > MAX_BATCH_CVS:
+            return jsonify({"error": f"cvs must contain 1..{MAX_BATCH_CVS} items"}), 400
+
+        try:
+            mode = resolve_mode(data)
+            response_format = resolve_format(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        invalid = [
+            i for i, cv in enumerate(cv_list)
+            if not isinstance(cv, str) or not validate_input(cv, max_input_chars(mode))
+        ]
+        if invalid:
+            return jsonify({"error": "Invalid input text", "invalid_indices": invalid}), 400
+
+        if response_format == "entities":
+            results = [
+                {"entities": build_entities(*result)}
+                for result in predict_cv_batch_cached(cv_list, mode)
+            ]
+            print(f"Parsed batch of {len(results)} CVs")
+            return encode_response(
+                {
+                    "format": "entities",
+                    "results": results,
+                    "status": "success",
+                    "processed_at": datetime.now().isoformat(),
+                }
+            )
+
+        if response_format == "columnar":
+            drop_o = request_flag(data, "drop_o")
+            results = [
+                build_columnar(*result, drop_o=drop_o)
+                for result in predict_cv_batch_cached(cv_list, mode)
+            ]
+            print(f"Parsed batch of {len(results)} CVs")
+            return encode_response(
+                {
+                    "format": "columnar",
+                    "idx2tag": IDX2TAG_LIST,
+                    "results": results,
+                    "status": "success",
+                    "processed_at": datetime.now().isoformat(),
+                }
+            )
+
+        results = [build_token_tag_pairs(*result) for result in predict_cv_batch_cached(cv_list, mode)]
+        print(f"Parsed batch of {len(results)} CVs")
+
+        return jsonify(
+            {
+                "results": [{"tokens": tokens} for tokens in results],
+                "status": "success",
+                "processed_at": datetime.now().isoformat(),
+            }
+        )
+
+    except Exception as e:
+        print(f"Error processing batch request: {str(e)}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+@app.route("/scheduler/stats", methods=["GET"])
+def scheduler_stats():
+    """Thống kê của inference scheduler để tinh chỉnh throughput và latency."""
+    return jsonify(inference_scheduler.stats())
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Thống kê cache kết quả NER."""
+    return jsonify(
+        {
+            "memory": memory_cache.stats(),
+            "disk": disk_cache.stats() if disk_cache is not None else None,
+        }
+    )
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Liveness probe: process còn chạy và nhận request."""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 503 cho tới khi warmup của worker trả lời request này xong.
+
+    Với NER_WORKERS > 1 các worker dùng chung socket nên mỗi lần probe có thể do worker khác trả lời;
+    các worker warmup song song ngay sau khi được fork.
+    """
+    return jsonify(
+        {
+            "ready": model_ready.is_set(),
+            "warmup": warmup_state,
+            "pid": os.getpid(),
+            "backend": NER_BACKEND,
+            "startup_timings": STARTUP_TIMINGS,
+        }
+    ), 200 if model_ready.is_set() else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus metrics; tổng hợp mọi worker nếu PROMETHEUS_MULTIPROC_DIR được đặt."""
+    if prometheus_client is None:
+        return jsonify({"error": "prometheus_client is not installed"}), 501
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        prometheus_multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+# ========== SERVING ==========
+def worker_thread_budget() -> int:
+    """Số intra-op thread cho mỗi worker."""
+    if TORCH_THREADS > 0:
+        return TORCH_THREADS
+    return max(1, (os.cpu_count() or 1) // SERVER_WORKERS)
+
+def configure_worker_threads(forked: bool) -> int:
+    """Áp dụng thread budget cho process hiện tại; gọi trong worker ngay sau khi fork."""
+    global onnx_session
+    threads = worker_thread_budget()
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(TORCH_INTEROP_THREADS)
+    except RuntimeError:
+        # Chỉ đặt được trước khi inter-op thread pool khởi động
+        print("Inter-op threads already initialized, keeping the current setting")
+
+    if forked and onnx_session is not None:
+        # Thread pool của onnxruntime không còn tồn tại sau fork: tạo lại session trong worker
+        onnx_session = load_onnx_session(intra_op_threads=ONNX_INTRA_OP_THREADS or threads)
+    return threads
+
+def run_worker(listen_fd=None, forked: bool = False):
+    """Chạy WSGI server trong process hiện tại, dùng chung socket nếu có listen_fd.
+
+    Dùng waitress (production) nếu đã cài; nếu không thì dùng server dev của werkzeug
+    (threaded, không giới hạn số thread, không dùng cho production).
+    """
+    threads = configure_worker_threads(forked)
+    # Warmup chạy trong từng worker sau fork: thread pool của torch/OpenMP không dùng chung được qua fork
+    start_warmup()
+    if waitress is not None:
+        print(
+            f"Worker {os.getpid()} serving on {SERVER_HOST}:{SERVER_PORT} with waitress "
+            f"({SERVER_HTTP_THREADS} HTTP threads, {threads} torch threads)"
+        )
+        if listen_fd is None:
+            waitress.serve(app, host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_HTTP_THREADS)
+        else:
+            waitress.serve(app, sockets=[socket.socket(fileno=listen_fd)], threads=SERVER_HTTP_THREADS)
+        return
+
+    from werkzeug.serving import make_server
+
+    print("waitress is not installed, falling back to the werkzeug development server (not for production)")
+    httpd = make_server(SERVER_HOST, SERVER_PORT, app, threaded=True, fd=listen_fd)
+    print(f"Worker {os.getpid()} serving on {SERVER_HOST}:{SERVER_PORT} with {threads} torch threads")
+    httpd.serve_forever()
+
+def serve():
+    """Pre-fork server: model đã load ở process chính, fork NER_WORKERS worker dùng chung socket.
+
+    Process chính chỉ giám sát: worker bị chết sẽ được fork lại, SIGTERM/SIGINT dừng tất cả.
+    """
+    if SERVER_WORKERS == 1:
+        run_worker()
+        return
+
+    metrics_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if prometheus_client is not None and metrics_dir:
+        # Xoá số liệu của lần chạy trước
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(metrics_dir, name))
+
+    family = socket.AF_INET6 if ":" in SERVER_HOST else socket.AF_INET
+    listener = socket.create_server((SERVER_HOST, SERVER_PORT), family=family, backlog=128)
+    # Object đã load không còn bị GC quét nữa, tránh copy các trang bộ nhớ dùng chung sau fork
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                run_worker(listener.fileno(), forked=True)
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {str(e)}")
+            finally:
+                os._exit(1)
+        workers.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(SERVER_WORKERS):
+        spawn()
+    print(f"Master {os.getpid()} started {SERVER_WORKERS} workers on {SERVER_HOST}:{SERVER_PORT}")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if prometheus_client is not None and metrics_dir:
+            prometheus_multiprocess.mark_process_dead(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}, restarting")
+            time.sleep(1)
+            spawn()
+    listener.close()
+
 if __name__ == "__main__":
-    app.run(debug=True, port=6969, host="0.0.0.0")
+    serve()
@@ -0,0 +1,217 @@
+"""Huấn luyện classifier head cho các layer trung gian của model NER (early exit) trên ner_resumes.
+
+Encoder được giữ nguyên, mỗi head là một Linear(hidden, num_labels) khởi tạo từ classifier gốc,
+học nhãn gốc cùng dự đoán của layer cuối:
+    loss = alpha * CE(nhãn gốc) + (1 - alpha) * KL(head || classifier cuối)
+Sau đó mỗi head được calibrate bằng temperature scaling trên phần file giữ lại, rồi đo đánh đổi
+tốc độ/chất lượng: với từng ngưỡng confidence (NER_EXIT_THRESHOLD) và từng số layer cố định
+(NER_EXIT_LAYERS) - layer dừng trung bình, độ chính xác theo token và tỉ lệ trùng với model đầy đủ.
+
+Usage:
+    python train_exit_heads.py [--layers 2,4,6,8,10] [--epochs 2] [--output models/exit_heads.pt]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+# Encoder đầy đủ, không dùng head cũ khi huấn luyện
+os.environ["NER_BACKEND"] = "torch"
+os.environ["NER_EXIT_THRESHOLD"] = "0"
+os.environ["NER_EXIT_LAYERS"] = "0"
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+import server
+from ner_dataset import LABELS_VERSION, labeled_sequences
+
+THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99)
+TEMPERATURES = np.linspace(0.5, 5.0, 46)
+
+
+def batches(sequences: list, batch_size: int, rng=None) -> list:
+    """Chia batch theo độ dài (ít padding); xáo thứ tự batch nếu có rng."""
+    order = sorted(range(len(sequences)), key=lambda i: len(sequences[i][0]))
+    groups = [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+    if rng is not None:
+        rng.shuffle(groups)
+    return groups
+
+
+def encode_batch(model, sequences: list, indices: list) -> tuple:
+    """Hidden state của mọi layer (không tính gradient), logits cuối, mask và nhãn gốc."""
+    batch = [sequences[i] for i in indices]
+    input_ids = server.pad_token_ids(
+        [server.tokens_to_ids(tokens) for tokens, _ in batch], max(len(tokens) for tokens, _ in batch)
+    )
+    labels = np.full(input_ids.shape, -100, dtype=np.int64)
+    for b, (_, tag_ids) in enumerate(batch):
+        labels[b, : len(tag_ids)] = tag_ids
+    ids = torch.from_numpy(input_ids)
+    masks = torch.from_numpy((input_ids > 0).astype(np.float32))
+    with torch.no_grad():
+        encoded_layers, _ = model.bert(ids, None, masks, output_all_encoded_layers=True)
+        final_logits = model.classifier(encoded_layers[-1])
+    return encoded_layers, final_logits, masks, torch.from_numpy(labels)
+
+
+def train_heads(model, heads: dict, sequences: list, args) -> list:
+    rng = random.Random(args.seed)
+    optimizer = torch.optim.AdamW([p for head in heads.values() for p in head.parameters()], lr=args.lr)
+    history = []
+    for epoch in range(args.epochs):
+        started = time.perf_counter()
+        losses = []
+        for indices in batches(sequences, args.batch_size, rng):
+            encoded_layers, final_logits, masks, labels = encode_batch(model, sequences, indices)
+            teacher = F.softmax(final_logits, dim=-1)
+            loss = 0
+            for layer, head in heads.items():
+                logits = head(encoded_layers[layer - 1])
+                ce = F.cross_entropy(logits.reshape(-1, logits.size(-1)), labels.reshape(-1), ignore_index=-100)
+                kd = (F.kl_div(F.log_softmax(logits, dim=-1), teacher, reduction="none").sum(-1) * masks).sum() / masks.sum()
+                loss = loss + args.alpha * ce + (1 - args.alpha) * kd
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            losses.append(loss.item() / len(heads))
+        history.append(
+            {"epoch": epoch + 1, "loss": round(float(np.mean(losses)), 4), "seconds": round(time.perf_counter() - started, 1)}
+        )
+        print(f"Epoch {epoch + 1}/{args.epochs}: {history[-1]}")
+    return history
+
+
+def collect_logits(model, heads: dict, sequences: list, batch_size: int) -> list:
+    """Logits (chưa chia temperature) của mọi head và của classifier cuối, theo từng chuỗi."""
+    num_layers = len(model.bert.encoder.layer)
+    collected = []
+    for indices in batches(sequences, batch_size):
+        encoded_layers, final_logits, _, _ = encode_batch(model, sequences, indices)
+        with torch.no_grad():
+            layer_logits = {layer: head(encoded_layers[layer - 1]) for layer, head in heads.items()}
+        layer_logits[num_layers] = final_logits
+        for b, i in enumerate(indices):
+            length = len(sequences[i][0])
+            collected.append(
+                (np.asarray(sequences[i][1]), {layer: logits[b, :length].numpy() for layer, logits in layer_logits.items()})
+            )
+    return collected
+
+
+def log_softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=-1, keepdims=True))
+
+
+def calibrate(collected: list, layers: list) -> dict:
+    """Temperature của mỗi head: giá trị trong TEMPERATURES cho NLL nhỏ nhất trên nhãn gốc."""
+    temperatures = {}
+    for layer in layers:
+        logits = np.concatenate([per_layer[layer] for _, per_layer in collected])
+        gold = np.concatenate([tag_ids for tag_ids, _ in collected])
+        nll = [-log_softmax(logits / t)[np.arange(len(gold)), gold].mean() for t in TEMPERATURES]
+        temperatures[layer] = float(TEMPERATURES[int(np.argmin(nll))])
+    return temperatures
+
+
+def simulate(collected: list, temperatures: dict, threshold: float, max_layer: int) -> dict:
+    """Layer dừng trung bình, độ chính xác theo token và tỉ lệ trùng với layer cuối, giống early_exit_forward."""
+    num_layers = max(temperatures)
+    exit_total = correct = agreed = tokens = 0
+    for gold, per_layer in collected:
+        for layer in sorted(temperatures):
+            if layer > max_layer:
+                break
+            scaled = per_layer[layer] / temperatures[layer]
+            confidence = np.exp(log_softmax(scaled)).max(axis=-1)
+            if layer == max_layer or (confidence >= threshold).all():
+                predicted = scaled.argmax(axis=-1)
+                break
+        exit_total += layer
+        correct += int((predicted == gold).sum())
+        agreed += int((predicted == per_layer[num_layers].argmax(axis=-1)).sum())
+        tokens += len(gold)
+    return {
+        "avg_exit_layer": round(exit_total / max(len(collected), 1), 3),
+        "token_accuracy": round(correct / max(tokens, 1), 4),
+        "agreement_with_full": round(agreed / max(tokens, 1), 4),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train early-exit heads for intermediate BERT layers")
+    parser.add_argument("--data", default=os.path.join("ner_resumes", "*.json"))
+    parser.add_argument("--layers", default="2,4,6,8,10", help="Các layer (đếm từ 1) được gắn head")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--alpha", type=float, default=0.5, help="Trọng số của loss trên nhãn gốc")
+    parser.add_argument("--calibration-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=server.EXIT_HEADS_PATH)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    model = server.bert_model
+    num_layers = len(model.bert.encoder.layer)
+    layers = sorted({int(item) for item in args.layers.split(",") if item.strip()})
+    if not layers or layers[0] < 1 or layers[-1] >= num_layers:
+        raise ValueError(f"--layers must be in 1..{num_layers - 1}")
+
+    files = sorted(glob.glob(args.data))
+    random.Random(args.seed).shuffle(files)
+    calibration_count = max(1, int(len(files) * args.calibration_fraction))
+    calibration_files, train_files = files[:calibration_count], files[calibration_count:]
+    train_sequences = labeled_sequences(train_files, server.tokenizer, server.tag2idx, server.MAX_LEN, sentences=True)
+    calibration_sequences = labeled_sequences(
+        calibration_files, server.tokenizer, server.tag2idx, server.MAX_LEN, sentences=True
+    )
+    print(f"Training sentences: {len(train_sequences)}, calibration sentences: {len(calibration_sequences)}")
+
+    heads = {}
+    for layer in layers:
+        head = torch.nn.Linear(model.classifier.in_features, model.classifier.out_features)
+        head.load_state_dict(model.classifier.state_dict())
+        heads[layer] = head
+    history = train_heads(model, heads, train_sequences, args)
+
+    collected = collect_logits(model, heads, calibration_sequences, args.batch_size)
+    temperatures = calibrate(collected, layers)
+    temperatures[num_layers] = 1.0
+    tradeoff = {
+        "threshold": {str(t): simulate(collected, temperatures, t, num_layers) for t in THRESHOLDS},
+        "truncate": {str(layer): simulate(collected, temperatures, float("inf"), layer) for layer in layers + [num_layers]},
+    }
+
+    torch.save(
+        {
+            "layers": layers,
+            "num_hidden_layers": num_layers,
+            "labels_version": LABELS_VERSION,
+            "state_dict": {f"{layer}.{name}": value for layer, head in heads.items() for name, value in head.state_dict().items()},
+            "temperatures": {str(layer): temperatures[layer] for layer in layers},
+        },
+        args.output,
+    )
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "data": args.data,
+        "labels_version": LABELS_VERSION,
+        "layers": layers,
+        "training_sentences": len(train_sequences),
+        "calibration_sentences": len(calibration_sequences),
+        "epochs": history,
+        "temperatures": {str(layer): temperatures[layer] for layer in layers},
+        "tradeoff": tradeoff,
+    }
+    report_path = os.path.splitext(args.output)[0] + "_report.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Saved exit heads to {args.output}, report to {report_path}")